@@ -36,6 +36,10 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
     DATABASE_SYNC_URL: str
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800  # seconds
+    DATABASE_QUERY_CACHE_SIZE: int = 1200  # compiled SQL statements kept per engine
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
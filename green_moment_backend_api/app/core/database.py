@@ -1,18 +1,45 @@
+from functools import lru_cache
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
-# Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+@lru_cache(maxsize=1)
+def get_engine():
+    """Create the async engine, with a pooled, health-checked set of connections, on first use"""
+    return create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.DEBUG,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_session_local():
+    """Create the async session factory on first use"""
+    return async_sessionmaker(
+        get_engine(),
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
 
-# Create async session factory
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+def __getattr__(name):
+    # `engine` and `AsyncSessionLocal` are built on first access, so importing
+    # the models (which only need Base) does not create an engine
+    if name == 'engine':
+        return get_engine()
+    if name == 'AsyncSessionLocal':
+        return get_session_local()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Create base class for models
 Base = declarative_base()
@@ -20,7 +47,7 @@ Base = declarative_base()
 
 async def get_db() -> AsyncSession:
     """Dependency to get database session"""
-    async with AsyncSessionLocal() as session:
+    async with get_session_local()() as session:
         try:
             yield session
         finally:
@@ -29,7 +56,7 @@ async def get_db() -> AsyncSession:
 
 async def init_db():
     """Initialize database - create tables if they don't exist"""
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         # Import all models here to ensure they are registered
         from app.models import user, chore, carbon_intensity, league, task, monthly_summary, notification
         
@@ -0,0 +1,41 @@
+import functools
+import json
+import logging
+from pathlib import Path
+
+import firebase_admin
+from firebase_admin import credentials
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _credentials_path() -> Path:
+    """Resolve the service account file, relative paths being relative to the backend root"""
+    cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
+    if not cred_path.is_absolute():
+        cred_path = Path(__file__).parent.parent.parent / settings.FIREBASE_CREDENTIALS_PATH
+    return cred_path
+
+
+@functools.lru_cache(maxsize=1)
+def _service_account_info() -> dict:
+    """Parsed service account JSON, read from disk only once per process"""
+    with open(_credentials_path(), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=1)
+def get_firebase_app() -> firebase_admin.App:
+    """Initialize the Firebase Admin SDK once and return the default app"""
+    try:
+        # Already initialized elsewhere in this process
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    
+    cred = credentials.Certificate(_service_account_info())
+    app = firebase_admin.initialize_app(cred)
+    logger.info("Firebase Admin SDK initialized successfully")
+    return app
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String, Boolean
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String, Boolean, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -6,6 +6,9 @@ from app.core.database import Base
 
 class MonthlySummary(Base):
     __tablename__ = "monthly_summaries"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'month', 'year', name='unique_user_month_year'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
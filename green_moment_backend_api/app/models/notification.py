@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Text, Enum, Integer
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, Text, Enum, Integer, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -21,6 +21,9 @@ class NotificationStatus(str, enum.Enum):
 class DeviceToken(Base):
     """Store FCM device tokens for users"""
     __tablename__ = "device_tokens"
+    __table_args__ = (
+        Index('ix_device_tokens_user_device', 'user_id', 'device_id'),
+    )
     
     id = Column(String, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
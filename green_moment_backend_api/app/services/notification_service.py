@@ -1,29 +1,25 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
+import asyncio
+from firebase_admin import exceptions, messaging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import json
 import logging
-from pathlib import Path
 
 from sqlalchemy import select, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import settings
+from app.core.firebase import get_firebase_app
 from app.models import DeviceToken, NotificationLog, NotificationSettings, User
 from app.models.notification import NotificationStatus
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK
-cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
-if not cred_path.is_absolute():
-    cred_path = Path(__file__).parent.parent.parent / settings.FIREBASE_CREDENTIALS_PATH
+# FCM accepts at most 500 messages per batch request
+FCM_MAX_BATCH_SIZE = 500
 
+# Initialize Firebase Admin SDK
 try:
-    cred = credentials.Certificate(str(cred_path))
-    firebase_admin.initialize_app(cred)
-    logger.info("Firebase Admin SDK initialized successfully")
+    get_firebase_app()
 except Exception as e:
     logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
     raise
@@ -43,18 +39,38 @@ class NotificationService:
     ) -> Dict[str, Any]:
         """Send a push notification to a specific user"""
         
-        # Get active device tokens for the user
         # Convert string user_id to integer for query
         try:
             user_id_int = int(user_id)
         except ValueError:
             logger.error(f"Invalid user_id format: {user_id}")
             return {"success": False, "error": "Invalid user ID format"}
-            
+        
+        return await NotificationService.send_bulk(
+            user_ids=[user_id_int],
+            body=body,
+            title=title,
+            data=data,
+            notification_type=notification_type,
+            db=db
+        )
+    
+    @staticmethod
+    async def send_bulk(
+        user_ids: List[int],
+        body: str,
+        title: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+        notification_type: str = "daily_recommendation",
+        db: Optional[AsyncSession] = None
+    ) -> Dict[str, Any]:
+        """Send the same push notification to every active device of the given users"""
+        
+        # Get active device tokens for all users in one query
         tokens_query = await db.execute(
             select(DeviceToken).where(
                 and_(
-                    DeviceToken.user_id == user_id_int,
+                    DeviceToken.user_id.in_(user_ids),
                     DeviceToken.is_active == True
                 )
             )
@@ -62,7 +78,7 @@ class NotificationService:
         device_tokens = tokens_query.scalars().all()
         
         if not device_tokens:
-            logger.warning(f"No active device tokens found for user {user_id}")
+            logger.warning(f"No active device tokens found for users {user_ids}")
             return {
                 "success": False,
                 "message": "No active device tokens found",
@@ -78,8 +94,7 @@ class NotificationService:
             )
         
         # Prepare data payload
-        if data is None:
-            data = {}
+        data = dict(data or {})
         data['notification_type'] = notification_type
         data['timestamp'] = datetime.utcnow().isoformat()
         
@@ -105,11 +120,11 @@ class NotificationService:
         success_count = 0
         failed_count = 0
         
-        # Send to each device token
+        # Create notification logs for every device with a single flush
+        log_entries = []
         for device_token in device_tokens:
-            # Create notification log
             log_entry = NotificationLog(
-                user_id=user_id_int,  # Use integer user_id
+                user_id=device_token.user_id,
                 device_token_id=device_token.id,
                 title=title,
                 body=body,
@@ -118,45 +133,62 @@ class NotificationService:
                 status=NotificationStatus.PENDING
             )
             db.add(log_entry)
-            await db.flush()
-            
+            log_entries.append(log_entry)
+        await db.flush()
+        
+        messages = [
+            messaging.Message(
+                notification=notification,
+                data=data_str,
+                token=device_token.token,
+                android=android_config,
+                apns=apns_config
+            )
+            for device_token in device_tokens
+        ]
+        
+        # FCM accepts at most FCM_MAX_BATCH_SIZE messages per send_each call
+        for start in range(0, len(messages), FCM_MAX_BATCH_SIZE):
+            end = start + FCM_MAX_BATCH_SIZE
+            batch = zip(device_tokens[start:end], log_entries[start:end])
             try:
-                # Create message
-                message = messaging.Message(
-                    notification=notification,
-                    data=data_str,
-                    token=device_token.token,
-                    android=android_config,
-                    apns=apns_config
-                )
-                
-                # Send message
-                response = messaging.send(message)
-                
-                # Update log entry
-                log_entry.status = NotificationStatus.SENT
-                log_entry.sent_at = datetime.utcnow()
-                log_entry.fcm_message_id = response
-                
-                # Update device token last used
-                device_token.last_used_at = datetime.utcnow()
-                
-                success_count += 1
-                logger.info(f"Notification sent successfully to {device_token.id}: {response}")
-                
-            except messaging.UnregisteredError:
-                # Token is no longer valid
-                logger.warning(f"Token {device_token.id} is unregistered, deactivating")
-                device_token.is_active = False
-                log_entry.status = NotificationStatus.FAILED
-                log_entry.error_message = "Token unregistered"
-                failed_count += 1
-                
-            except Exception as e:
-                logger.error(f"Failed to send notification to {device_token.id}: {e}")
-                log_entry.status = NotificationStatus.FAILED
-                log_entry.error_message = str(e)
-                failed_count += 1
+                batch_response = await messaging.send_each_async(messages[start:end])
+            except exceptions.FirebaseError as e:
+                # The whole batch failed (auth, transport, quota); keep going
+                # with the next one and record the error on each log entry
+                logger.error(f"Failed to send notification batch of {len(messages[start:end])}: {e}")
+                for device_token, log_entry in batch:
+                    log_entry.status = NotificationStatus.FAILED
+                    log_entry.error_message = str(e)
+                    failed_count += 1
+                continue
+            
+            for (device_token, log_entry), response in zip(batch, batch_response.responses):
+                if isinstance(response.exception, messaging.UnregisteredError):
+                    # Token is no longer valid
+                    logger.warning(f"Token {device_token.id} is unregistered, deactivating")
+                    device_token.is_active = False
+                    log_entry.status = NotificationStatus.FAILED
+                    log_entry.error_message = "Token unregistered"
+                    failed_count += 1
+                    
+                elif not response.success:
+                    logger.error(f"Failed to send notification to {device_token.id}: {response.exception}")
+                    log_entry.status = NotificationStatus.FAILED
+                    log_entry.error_message = str(response.exception)
+                    failed_count += 1
+                    
+                else:
+                    # Update log entry
+                    log_entry.status = NotificationStatus.SENT
+                    log_entry.sent_at = datetime.utcnow()
+                    log_entry.fcm_message_id = response.message_id
+                    
+                    # Update device token last used
+                    device_token.last_used_at = datetime.utcnow()
+                    
+                    success_count += 1
+                    logger.info(f"Notification sent successfully to {device_token.id}: {response.message_id}")
         
         await db.commit()
         
@@ -208,7 +240,7 @@ class NotificationService:
             )
             
             # Send with dry_run=True to validate without actually sending
-            messaging.send(message, dry_run=True)
+            await asyncio.to_thread(messaging.send, message, dry_run=True)
             return True
             
         except Exception as e:
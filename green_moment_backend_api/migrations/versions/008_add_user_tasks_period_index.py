@@ -0,0 +1,35 @@
+"""Add composite index on user_tasks (user_id, month, year)
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-08-12
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '008'
+down_revision = '007'
+
+
+def upgrade():
+    # Monthly task lookups filter by user and period. Build the index
+    # concurrently so existing user_tasks rows stay writable.
+    # ix_device_tokens_user_device already exists (migration 004).
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_tasks_user_month_year',
+            'user_tasks',
+            ['user_id', 'month', 'year'],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_tasks_user_month_year',
+            table_name='user_tasks',
+            postgresql_concurrently=True
+        )
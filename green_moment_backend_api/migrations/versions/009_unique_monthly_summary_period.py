@@ -0,0 +1,51 @@
+"""Make monthly_summaries unique per (user_id, month, year)
+
+This migration changes data: when a user has more than one summary for the
+same month, only the newest (highest id) is kept. The older rows are copied
+to monthly_summaries_dupes before they are deleted, and downgrade() puts
+them back.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-08-12
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '009'
+down_revision = '008'
+
+
+def upgrade():
+    # Keep only the newest summary for each user and month before adding the
+    # constraint that lets summaries be upserted with ON CONFLICT. Older
+    # duplicates are archived first so nothing is lost.
+    op.execute("""
+        CREATE TABLE monthly_summaries_dupes AS
+        SELECT a.*
+        FROM monthly_summaries a
+        WHERE EXISTS (
+            SELECT 1 FROM monthly_summaries b
+            WHERE b.user_id = a.user_id
+              AND b.month = a.month
+              AND b.year = a.year
+              AND b.id > a.id
+        )
+    """)
+    op.execute("""
+        DELETE FROM monthly_summaries
+        WHERE id IN (SELECT id FROM monthly_summaries_dupes)
+    """)
+    op.create_unique_constraint(
+        'unique_user_month_year',
+        'monthly_summaries',
+        ['user_id', 'month', 'year']
+    )
+
+
+def downgrade():
+    op.drop_constraint('unique_user_month_year', 'monthly_summaries', type_='unique')
+    # Restore the duplicates removed by upgrade()
+    op.execute("INSERT INTO monthly_summaries SELECT * FROM monthly_summaries_dupes")
+    op.drop_table('monthly_summaries_dupes')
@@ -0,0 +1,15 @@
+"""
+Put the backend root on sys.path so scripts run directly
+(e.g. `python scripts/test_notification.py`) can import the app package
+
+scripts/ is not a package, so `import _bootstrap` only resolves when the
+script is run by path, which puts scripts/ itself on sys.path. Running them
+as modules (`python -m scripts.test_notification`) is not supported.
+"""
+
+import sys
+from pathlib import Path
+
+_root = str(Path(__file__).resolve().parent.parent)
+if _root not in sys.path:
+    sys.path.insert(0, _root)
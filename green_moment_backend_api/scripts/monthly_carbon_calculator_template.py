@@ -9,8 +9,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 from sqlalchemy import select, and_
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 # Add parent directory to path for imports
 import sys
@@ -38,9 +37,8 @@ class MonthlyCarbonCalculator:
     def __init__(self):
         self.carbon_csv_path = Path("logs/actual_carbon_intensity.csv")
         self.engine = create_async_engine(settings.DATABASE_URL)
-        self.AsyncSessionLocal = sessionmaker(
-            self.engine, 
-            class_=AsyncSession,
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.engine,
             expire_on_commit=False
         )
         
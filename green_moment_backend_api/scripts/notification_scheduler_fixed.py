@@ -4,19 +4,23 @@ Fixed Notification Scheduler - Works around the enum issue
 """
 
 import asyncio
+import functools
+import json
 import logging
+import os
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
-import json
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping
+
+import orjson
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 import firebase_admin
 from firebase_admin import credentials, messaging
 
@@ -41,7 +45,20 @@ logger = logging.getLogger(__name__)
 
 # Create async engine
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+CARBON_INTENSITY_JSON = Path(__file__).parent.parent / "data" / "carbon_intensity.json"
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_carbon_intensity(path: str, mtime_ns: int) -> Mapping[str, Any]:
+    return MappingProxyType(orjson.loads(Path(path).read_bytes()))
+
+
+def load_carbon_intensity(path: Path = CARBON_INTENSITY_JSON) -> Mapping[str, Any]:
+    """Read-only view of carbon_intensity.json, re-parsed only when the file changes"""
+    return _parse_carbon_intensity(str(path), os.stat(path).st_mtime_ns)
 
 
 class NotificationScheduler:
@@ -157,9 +174,7 @@ class NotificationScheduler:
     async def get_recommendation_from_json(self) -> Dict[str, str]:
         """Get the recommended period from carbon_intensity.json"""
         try:
-            json_path = Path(__file__).parent.parent / "data" / "carbon_intensity.json"
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = load_carbon_intensity()
             
             if 'recommendation' in data:
                 return {
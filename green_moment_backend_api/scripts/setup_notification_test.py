@@ -13,8 +13,7 @@ import json
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy import select, text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from app.core.config import settings
 from app.models import User, NotificationSettings
@@ -22,7 +21,7 @@ from app.services.notification_service import NotificationService
 
 # Create async engine
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 
 async def setup_notification_for_scheduler(email: str, fcm_token: str):
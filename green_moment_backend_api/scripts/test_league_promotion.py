@@ -6,12 +6,10 @@ This script simulates a month's worth of activity and triggers promotion
 
 import asyncio
 import sys
-import os
 from datetime import datetime, timedelta
-from sqlalchemy import select, and_, update
+from sqlalchemy import select, and_, update, func
 
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import _bootstrap  # noqa: F401  (adds the backend root to sys.path)
 
 from app.core.database import AsyncSessionLocal
 from app.models.user import User
@@ -24,13 +22,12 @@ from scripts.league_promotion_scheduler import LeaguePromotionService
 async def setup_test_user():
     """Create or get a test user"""
     async with AsyncSessionLocal() as db:
-        # Get or create test user
-        result = await db.execute(
-            select(User).where(User.username == "league_test_user")
-        )
-        user = result.scalar_one_or_none()
+        # Get or create test user (check by id first so the miss path skips loading the entity)
+        existing_id = (await db.execute(
+            select(User.id).where(User.username == "league_test_user").limit(1)
+        )).scalar_one_or_none()
         
-        if not user:
+        if existing_id is None:
             user = User(
                 username="league_test_user",
                 email="league_test@example.com",
@@ -42,6 +39,7 @@ async def setup_test_user():
             await db.refresh(user)
             print(f"✅ Created test user: {user.username}")
         else:
+            user = await db.get(User, existing_id)
             print(f"✅ Found existing test user: {user.username} (League: {user.current_league})")
         
         return user.id
@@ -194,8 +192,12 @@ async def run_promotion_check(user_id: int):
         print(f"   Current league: {user.current_league}")
 
 
-async def check_current_month_tasks(user_id: int):
-    """Check tasks for current month"""
+async def check_current_month_tasks(user_id: int, aggregate: bool = False):
+    """Check tasks for current month
+    
+    With aggregate=True only the completed/total counts are fetched, computed
+    by the database instead of materializing every task row.
+    """
     async with AsyncSessionLocal() as db:
         current_month = datetime.now().month
         current_year = datetime.now().year
@@ -204,20 +206,31 @@ async def check_current_month_tasks(user_id: int):
         result = await db.execute(select(User).where(User.id == user_id))
         user = result.scalar_one()
         
-        # Get current month tasks
-        result = await db.execute(
-            select(UserTask, Task).join(Task).where(
-                and_(
-                    UserTask.user_id == user_id,
-                    UserTask.month == current_month,
-                    UserTask.year == current_year
-                )
-            )
+        month_filter = and_(
+            UserTask.user_id == user_id,
+            UserTask.month == current_month,
+            UserTask.year == current_year
         )
         
         print(f"\n📅 Current month ({current_month}/{current_year}) tasks for {user.username}:")
         print(f"   League: {user.current_league}")
         
+        if aggregate:
+            result = await db.execute(
+                select(
+                    func.count().filter(UserTask.completed),
+                    func.count()
+                ).select_from(UserTask).join(Task).where(month_filter)
+            )
+            completed, total = result.one()
+            print(f"   Completed: {completed}/{total}")
+            return
+        
+        # Get current month tasks
+        result = await db.execute(
+            select(UserTask, Task).join(Task).where(month_filter)
+        )
+        
         for user_task, task in result:
             status = "✅" if user_task.completed else "❌"
             print(f"   {status} {task.name} ({task.points} points)")
@@ -241,7 +254,7 @@ async def main():
     elif "--skip-tasks" in sys.argv:
         complete_tasks = False
     else:
-        response = input("\nComplete all tasks for promotion? (y/n): ")
+        response = await asyncio.to_thread(input, "\nComplete all tasks for promotion? (y/n): ")
         complete_tasks = response.lower() == 'y'
     
     # Simulate last month activity
@@ -250,13 +263,14 @@ async def main():
     # Run promotion check
     await run_promotion_check(user_id)
     
-    # Show current month tasks
-    await check_current_month_tasks(user_id)
+    # Show current month tasks (per-task listing only with --verbose)
+    await check_current_month_tasks(user_id, aggregate="--verbose" not in sys.argv)
     
     print("\n✨ Test completed!")
     print("\nTo test different scenarios:")
     print("- Run with --complete-tasks to auto-complete tasks")
     print("- Run with --skip-tasks to skip task completion")
+    print("- Run with --verbose to list each current month task")
     print("- Change user's league in database and run again")
 
 
@@ -4,30 +4,22 @@ Test script to set up and test push notifications
 """
 
 import asyncio
-import sys
 from datetime import datetime
-from pathlib import Path
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (adds the backend root to sys.path)
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.core.config import settings
+from app.core.database import get_session_local
 from app.models import User, DeviceToken, NotificationSettings
 from app.services.notification_service import NotificationService
 
-# Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
 
 async def setup_test_user():
     """Set up a test user with device token and notification settings"""
     
-    async with AsyncSessionLocal() as db:
+    async with get_session_local()() as db:
         # Find or create a test user
         result = await db.execute(
             select(User).where(User.username == "test_notification_user")
@@ -50,68 +42,56 @@ async def setup_test_user():
         else:
             print(f"Found existing test user with ID: {user.id}")
         
-        # Create/update device token
-        device_token = await db.execute(
-            select(DeviceToken).where(
-                DeviceToken.user_id == user.id,
-                DeviceToken.device_id == "test_device_001"
-            )
-        )
-        device_token = device_token.scalar_one_or_none()
-        
-        if not device_token:
-            print("Creating test device token...")
-            device_token = DeviceToken(
-                user_id=user.id,
-                # This is a dummy token - replace with a real FCM token for actual testing
-                token="TEST_FCM_TOKEN_12345",
-                platform="android",
-                device_id="test_device_001",
-                app_version="1.0.0"
-            )
-            db.add(device_token)
-        else:
-            print("Updating existing device token...")
-            device_token.is_active = True
-            device_token.updated_at = datetime.utcnow()
-        
-        # Create/update notification settings
-        settings_result = await db.execute(
-            select(NotificationSettings).where(
-                NotificationSettings.user_id == user.id
-            )
+        # Create/update device token in one statement (the primary key is "<user_id>_<device_id>")
+        print("Saving test device token...")
+        token_stmt = pg_insert(DeviceToken).values(
+            id=f"{user.id}_test_device_001",
+            user_id=user.id,
+            # This is a dummy token - replace with a real FCM token for actual testing
+            token="TEST_FCM_TOKEN_12345",
+            platform="android",
+            device_id="test_device_001",
+            app_version="1.0.0"
         )
-        notification_settings = settings_result.scalar_one_or_none()
+        token_stmt = token_stmt.on_conflict_do_update(
+            index_elements=[DeviceToken.id],
+            set_={"is_active": True, "updated_at": datetime.utcnow()}
+        ).returning(DeviceToken.token)
+        device_token = (await db.execute(token_stmt)).scalar_one()
         
         # Get current time for immediate testing
         current_time = datetime.now().strftime("%H:%M")
         
-        if not notification_settings:
-            print(f"Creating notification settings for {current_time}...")
-            notification_settings = NotificationSettings(
-                user_id=user.id,
-                enabled=True,
-                scheduled_time=current_time,  # Set to current time for immediate test
-                daily_recommendation=True,
-                achievement_alerts=True,
-                weekly_summary=True
-            )
-            db.add(notification_settings)
-        else:
-            print(f"Updating notification settings to {current_time}...")
-            notification_settings.enabled = True
-            notification_settings.scheduled_time = current_time
-            notification_settings.daily_recommendation = True
-            notification_settings.updated_at = datetime.utcnow()
+        # Create/update notification settings (user_id is unique)
+        print(f"Saving notification settings for {current_time}...")
+        settings_stmt = pg_insert(NotificationSettings).values(
+            id=f"noti_settings_{user.id}",
+            user_id=user.id,
+            enabled=True,
+            scheduled_time=current_time,  # Set to current time for immediate test
+            daily_recommendation=True,
+            achievement_alerts=True,
+            weekly_summary=True
+        )
+        settings_stmt = settings_stmt.on_conflict_do_update(
+            index_elements=[NotificationSettings.user_id],
+            set_={
+                "enabled": True,
+                "scheduled_time": settings_stmt.excluded.scheduled_time,
+                "daily_recommendation": True,
+                "updated_at": datetime.utcnow()
+            }
+        )
+        await db.execute(settings_stmt)
         
         await db.commit()
         
         print("\n✅ Test user setup complete!")
         print(f"User ID: {user.id}")
         print(f"Username: {user.username}")
-        print(f"Device Token: {device_token.token[:20]}...")
-        print(f"Notification Time: {notification_settings.scheduled_time}")
-        print(f"Notifications Enabled: {notification_settings.enabled}")
+        print(f"Device Token: {device_token[:20]}...")
+        print(f"Notification Time: {current_time}")
+        print("Notifications Enabled: True")
         
         return user.id
 
@@ -121,9 +101,9 @@ async def test_send_notification(user_id: int):
     
     print("\n🔔 Testing direct notification send...")
     
-    async with AsyncSessionLocal() as db:
-        result = await NotificationService.send_notification(
-            user_id=str(user_id),
+    async with get_session_local()() as db:
+        result = await NotificationService.send_bulk(
+            user_ids=[user_id],
             body="測試通知：現在是低碳時段！快來使用高耗能家電吧 💚",
             title=None,  # No title as per Flutter app requirement
             data={
@@ -148,8 +128,10 @@ async def main():
     user_id = await setup_test_user()
     
     # Step 2: Test direct notification (optional)
-    print("\nDo you want to test sending a notification directly? (y/n): ", end="")
-    response = input().strip().lower()
+    response = await asyncio.to_thread(
+        input, "\nDo you want to test sending a notification directly? (y/n): "
+    )
+    response = response.strip().lower()
     
     if response == 'y':
         await test_send_notification(user_id)
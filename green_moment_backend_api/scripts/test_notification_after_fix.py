@@ -4,30 +4,22 @@ Test notification setup after fixing the models
 """
 
 import asyncio
-import sys
 from datetime import datetime
-from pathlib import Path
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (adds the backend root to sys.path)
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.core.config import settings
+from app.core.database import get_session_local
 from app.models import User, DeviceToken, NotificationSettings
 from app.services.notification_service import NotificationService
 
-# Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
 
 async def test_notification_with_fixed_models(email: str, fcm_token: str):
     """Test notification with the fixed models"""
     
-    async with AsyncSessionLocal() as db:
+    async with get_session_local()() as db:
         try:
             print("🔍 Finding user...")
             # Find user
@@ -42,39 +34,33 @@ async def test_notification_with_fixed_models(email: str, fcm_token: str):
                 
             print(f"✅ Found user: {user.username} (ID: {user.id}, Type: {type(user.id)})")
             
-            # Test 1: Create/update device token using ORM
-            print("\n📱 Testing device token with ORM...")
+            # Test 1: Create/update device token
+            print("\n📱 Testing device token upsert...")
             
-            # Check existing token
-            existing_token = await db.execute(
-                select(DeviceToken).where(
-                    DeviceToken.user_id == user.id,  # Now using integer directly
-                    DeviceToken.device_id == "test_fixed_models"
-                )
+            # Upsert keyed on the "<user_id>_<device_id>" primary key
+            token_stmt = pg_insert(DeviceToken).values(
+                id=f"{user.id}_test_fixed_models",
+                user_id=user.id,  # Integer now!
+                token=fcm_token,
+                platform="android",
+                device_id="test_fixed_models",
+                app_version="1.0.0"
             )
-            existing_token = existing_token.scalar_one_or_none()
-            
-            if existing_token:
-                print("  Updating existing token...")
-                existing_token.token = fcm_token
-                existing_token.is_active = True
-                existing_token.updated_at = datetime.utcnow()
-            else:
-                print("  Creating new token...")
-                device_token = DeviceToken(
-                    user_id=user.id,  # Integer now!
-                    token=fcm_token,
-                    platform="android",
-                    device_id="test_fixed_models",
-                    app_version="1.0.0"
-                )
-                db.add(device_token)
+            token_stmt = token_stmt.on_conflict_do_update(
+                index_elements=[DeviceToken.id],
+                set_={
+                    "token": token_stmt.excluded.token,
+                    "is_active": True,
+                    "updated_at": datetime.utcnow()
+                }
+            )
+            await db.execute(token_stmt)
             
             await db.commit()
-            print("✅ Device token saved via ORM!")
+            print("✅ Device token saved!")
             
-            # Test 2: Create/update notification settings using ORM
-            print("\n🔔 Testing notification settings with ORM...")
+            # Test 2: Create/update notification settings
+            print("\n🔔 Testing notification settings upsert...")
             
             # Calculate next X0 minute
             now = datetime.now()
@@ -86,30 +72,24 @@ async def test_notification_with_fixed_models(email: str, fcm_token: str):
                 scheduled_hour = now.hour
             scheduled_time = f"{scheduled_hour:02d}:{next_10_minute:02d}"
             
-            # Check existing settings
-            existing_settings = await db.execute(
-                select(NotificationSettings).where(
-                    NotificationSettings.user_id == user.id  # Integer now!
-                )
+            # Upsert keyed on the unique user_id
+            settings_stmt = pg_insert(NotificationSettings).values(
+                id=f"noti_settings_{user.id}",
+                user_id=user.id,  # Integer now!
+                enabled=True,
+                daily_recommendation=True,
+                scheduled_time=scheduled_time
             )
-            existing_settings = existing_settings.scalar_one_or_none()
-            
-            if existing_settings:
-                print("  Updating existing settings...")
-                existing_settings.enabled = True
-                existing_settings.daily_recommendation = True
-                existing_settings.scheduled_time = scheduled_time
-                existing_settings.updated_at = datetime.utcnow()
-            else:
-                print("  Creating new settings...")
-                settings = NotificationSettings(
-                    user_id=user.id,  # Integer now!
-                    enabled=True,
-                    daily_recommendation=True,
-                    scheduled_time=scheduled_time,
-                    weather_updates=False
-                )
-                db.add(settings)
+            settings_stmt = settings_stmt.on_conflict_do_update(
+                index_elements=[NotificationSettings.user_id],
+                set_={
+                    "enabled": True,
+                    "daily_recommendation": True,
+                    "scheduled_time": settings_stmt.excluded.scheduled_time,
+                    "updated_at": datetime.utcnow()
+                }
+            )
+            await db.execute(settings_stmt)
             
             await db.commit()
             print(f"✅ Notification settings saved! Scheduled for: {scheduled_time}")
@@ -150,10 +130,10 @@ async def main():
     print("🔧 Testing Notifications After Model Fix")
     print("=" * 50)
     
-    email = input("\n📧 Enter your Gmail address: ").strip()
+    email = (await asyncio.to_thread(input, "\n📧 Enter your Gmail address: ")).strip()
     print("\n📱 Enter the FCM token from your phone")
     print("(You can find this in the app's dashboard)")
-    token = input("Token: ").strip()
+    token = (await asyncio.to_thread(input, "Token: ")).strip()
     
     if email and token:
         await test_notification_with_fixed_models(email, token)
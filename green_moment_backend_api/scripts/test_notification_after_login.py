@@ -5,9 +5,8 @@ Test notification after user logs in with new token
 
 import asyncio
 import sys
-from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
+import _bootstrap  # noqa: F401  (adds the backend root to sys.path)
 
 from sqlalchemy import select
 from app.core.database import AsyncSessionLocal
@@ -32,14 +31,14 @@ async def test_notification(username: str):
             
         print(f"📊 User: {user.username} (ID: {user.id})")
         
-        # Check device tokens
+        # Check device tokens (only the columns printed below)
         result = await db.execute(
-            select(DeviceToken).where(
+            select(DeviceToken.token, DeviceToken.updated_at).where(
                 (DeviceToken.user_id == user.id) & 
                 (DeviceToken.is_active == True)
             )
         )
-        tokens = result.scalars().all()
+        tokens = result.all()
         
         if not tokens:
             print("❌ No active device tokens found")
@@ -47,27 +46,22 @@ async def test_notification(username: str):
             return
             
         print(f"📱 Found {len(tokens)} active device token(s)")
-        for token in tokens:
-            print(f"   - Token: {token.token[:50]}...")
-            print(f"   - Updated: {token.updated_at}")
+        for token, updated_at in tokens:
+            print(f"   - Token: {token[:50]}...")
+            print(f"   - Updated: {updated_at}")
         
         # Send test notification
-        notification_service = NotificationService()
+        result = await NotificationService.send_bulk(
+            user_ids=[user.id],
+            body=f"測試通知 🎉 時間：{datetime.now().strftime('%H:%M')}",
+            notification_type="test",
+            db=db
+        )
         
-        try:
-            success = await notification_service.send_notification(
-                user_id=user.id,
-                body=f"測試通知 🎉 時間：{datetime.now().strftime('%H:%M')}",
-                notification_type="test"
-            )
-            
-            if success:
-                print("✅ Notification sent successfully!")
-            else:
-                print("❌ Failed to send notification")
-                
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        if result.get("success"):
+            print("✅ Notification sent successfully!")
+        else:
+            print(f"❌ Failed to send notification: {result.get('message')}")
 
 
 if __name__ == "__main__":
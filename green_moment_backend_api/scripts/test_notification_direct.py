@@ -7,60 +7,110 @@ import asyncio
 import sys
 from datetime import datetime
 from pathlib import Path
-import json
+
+import orjson
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from sqlalchemy import select, text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Integer, bindparam, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 from app.models import User, DeviceToken, NotificationSettings
-import firebase_admin
-from firebase_admin import credentials, messaging
+from app.core.firebase import get_firebase_app
+from app.services.notification_service import NotificationService
+from firebase_admin import messaging
+
+
+# Built once so every call hands SQLAlchemy/asyncpg the same statement
+_SELECT_TOKENS = text("""
+    SELECT device_id, is_active, created_at,
+           substring(token from 1 for 50) AS token_preview
+    FROM device_tokens 
+    WHERE user_id = :user_id
+    ORDER BY created_at DESC
+    LIMIT 20
+""").bindparams(bindparam("user_id", type_=Integer))
+
+# FCM data values must be strings; serialize the fixed payload once
+TEST_OPTIMAL_HOURS = orjson.dumps([10, 14, 22]).decode('ascii')
 
-# Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# FCM accepts at most 500 tokens per multicast request
+FCM_MAX_BATCH_SIZE = 500
 
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    # Resolve the path relative to the backend api directory
-    firebase_path = Path(__file__).parent.parent / settings.FIREBASE_CREDENTIALS_PATH
-    cred = credentials.Certificate(str(firebase_path))
-    firebase_admin.initialize_app(cred)
-    print("✅ Firebase Admin SDK initialized")
+TEST_BODY = "測試通知：現在是低碳時段！快來使用高耗能家電吧 💚"
+
+
+async def send_batch(tokens: list, body: str, data: dict):
+    """Send one notification to many tokens, batched through multicast requests
+    
+    Returns (success_count, failure_count) across all batches.
+    """
+    get_firebase_app()
+    
+    success_count = 0
+    failure_count = 0
+    
+    for start in range(0, len(tokens), FCM_MAX_BATCH_SIZE):
+        chunk = tokens[start:start + FCM_MAX_BATCH_SIZE]
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(body=body),
+            data=data,
+            tokens=chunk
+        )
+        batch_response = await messaging.send_each_for_multicast_async(message)
+        success_count += batch_response.success_count
+        failure_count += batch_response.failure_count
+        
+        for token, response in zip(chunk, batch_response.responses):
+            if response.success:
+                print(f"✅ Successfully sent message: {response.message_id}")
+            else:
+                print(f"❌ Error sending message to {token[:20]}...: {response.exception}")
+    
+    return success_count, failure_count
 
 
 async def send_direct_notification(fcm_token: str):
     """Send notification directly using FCM token"""
     
     try:
-        # Create the message
-        message = messaging.Message(
-            notification=messaging.Notification(
-                body="測試通知：現在是低碳時段！快來使用高耗能家電吧 💚"
-            ),
+        success_count, _ = await send_batch(
+            [fcm_token],
+            body=TEST_BODY,
             data={
                 'type': 'test',
-                'optimal_hours': json.dumps([10, 14, 22]),
+                'optimal_hours': TEST_OPTIMAL_HOURS,
                 'timestamp': datetime.now().isoformat()
-            },
-            token=fcm_token
+            }
         )
-        
-        # Send the message
-        response = messaging.send(message)
-        print(f"✅ Successfully sent message: {response}")
-        return True
+        return success_count > 0
         
     except Exception as e:
         print(f"❌ Error sending message: {e}")
         return False
 
 
+async def send_user_notification(user_id: int):
+    """Send the test notification to a user's saved devices through NotificationService"""
+    
+    async with AsyncSessionLocal() as db:
+        result = await NotificationService.send_bulk(
+            user_ids=[user_id],
+            body=TEST_BODY,
+            data={
+                'type': 'test',
+                'optimal_hours': TEST_OPTIMAL_HOURS
+            },
+            notification_type='test_notification',
+            db=db
+        )
+    
+    print(f"📊 Result: {result}")
+    return result['success']
+
+
 async def check_device_tokens(user_email: str):
     """Check device tokens in database"""
     
@@ -78,15 +128,7 @@ async def check_device_tokens(user_email: str):
         print(f"✅ Found user: {user.username} (ID: {user.id}, Type: {type(user.id)})")
         
         # Check device tokens with raw SQL to avoid type issues
-        result = await db.execute(
-            text("""
-                SELECT id, user_id, token, device_id, is_active, created_at 
-                FROM device_tokens 
-                WHERE user_id = :user_id::text
-                ORDER BY created_at DESC
-            """),
-            {"user_id": str(user.id)}
-        )
+        result = await db.execute(_SELECT_TOKENS, {"user_id": user.id})
         
         tokens = result.fetchall()
         
@@ -96,7 +138,7 @@ async def check_device_tokens(user_email: str):
                 print(f"  - Device: {token.device_id}")
                 print(f"    Active: {token.is_active}")
                 print(f"    Created: {token.created_at}")
-                print(f"    Token: {token.token[:50]}...")
+                print(f"    Token: {token.token_preview}...")
         else:
             print("\n❌ No device tokens found for this user")
             
@@ -104,37 +146,31 @@ async def check_device_tokens(user_email: str):
 
 
 async def save_device_token_direct(user_id: int, fcm_token: str):
-    """Save device token using direct SQL to avoid type issues"""
+    """Save device token with a single upsert"""
     
     async with AsyncSessionLocal() as db:
         try:
-            # Delete existing token for this device
-            await db.execute(
-                text("""
-                    DELETE FROM device_tokens 
-                    WHERE user_id = :user_id::text 
-                    AND device_id = :device_id
-                """),
-                {"user_id": str(user_id), "device_id": "test_device"}
+            # Insert or refresh the token in one statement; the primary key
+            # is "<user_id>_<device_id>" so it identifies this device
+            stmt = pg_insert(DeviceToken).values(
+                id=f"{user_id}_test_device",
+                user_id=user_id,
+                token=fcm_token,
+                platform="android",
+                device_id="test_device",
+                app_version="1.0.0",
+                is_active=True
             )
-            
-            # Insert new token
-            await db.execute(
-                text("""
-                    INSERT INTO device_tokens 
-                    (id, user_id, token, platform, device_id, app_version, is_active, created_at, updated_at, last_used_at)
-                    VALUES 
-                    (:id, :user_id::text, :token, :platform, :device_id, :app_version, true, NOW(), NOW(), NOW())
-                """),
-                {
-                    "id": f"{user_id}_test_device",
-                    "user_id": str(user_id),
-                    "token": fcm_token,
-                    "platform": "android",
-                    "device_id": "test_device",
-                    "app_version": "1.0.0"
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DeviceToken.id],
+                set_={
+                    "token": stmt.excluded.token,
+                    "is_active": True,
+                    "updated_at": func.now(),
+                    "last_used_at": func.now()
                 }
             )
+            await db.execute(stmt)
             
             await db.commit()
             print("✅ Device token saved successfully")
@@ -154,13 +190,13 @@ async def main():
     print("2. Check device tokens for a user")
     print("3. Save token and send notification")
     
-    choice = input("\nSelect option (1-3): ").strip()
+    choice = (await asyncio.to_thread(input, "\nSelect option (1-3): ")).strip()
     
     if choice == "1":
         # Direct send
         print("\n📱 Enter the FCM token from your phone")
         print("(You can find this in the app's dashboard - orange debug box)")
-        token = input("Token: ").strip()
+        token = (await asyncio.to_thread(input, "Token: ")).strip()
         
         if token:
             print("\n🔔 Sending notification directly...")
@@ -172,14 +208,14 @@ async def main():
                 
     elif choice == "2":
         # Check tokens
-        email = input("\n📧 Enter your Gmail address: ").strip()
+        email = (await asyncio.to_thread(input, "\n📧 Enter your Gmail address: ")).strip()
         if email:
             await check_device_tokens(email)
             
     elif choice == "3":
         # Save and send
-        email = input("\n📧 Enter your Gmail address: ").strip()
-        token = input("📱 Enter FCM token: ").strip()
+        email = (await asyncio.to_thread(input, "\n📧 Enter your Gmail address: ")).strip()
+        token = (await asyncio.to_thread(input, "📱 Enter FCM token: ")).strip()
         
         if email and token:
             user_id = await check_device_tokens(email)
@@ -188,7 +224,7 @@ async def main():
                 await save_device_token_direct(user_id, token)
                 
                 print("\n🔔 Sending notification...")
-                success = await send_direct_notification(token)
+                success = await send_user_notification(user_id)
                 if success:
                     print("\n✅ Notification sent! Check your phone!")
                 else:
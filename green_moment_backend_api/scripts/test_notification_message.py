@@ -4,11 +4,14 @@
 import asyncio
 import sys
 from pathlib import Path
-import json
 
 sys.path.append(str(Path(__file__).parent.parent))
 
-from scripts.notification_scheduler_fixed import NotificationScheduler
+from scripts.notification_scheduler_fixed import (
+    CARBON_INTENSITY_JSON,
+    NotificationScheduler,
+    load_carbon_intensity,
+)
 
 
 async def test_notification_message():
@@ -17,11 +20,8 @@ async def test_notification_message():
     scheduler = NotificationScheduler()
     
     # Read current carbon_intensity.json
-    json_path = Path(__file__).parent.parent / "data" / "carbon_intensity.json"
-    print(f"Reading from: {json_path}")
-    
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    print(f"Reading from: {CARBON_INTENSITY_JSON}")
+    data = load_carbon_intensity()
     
     if 'recommendation' in data:
         print(f"\nCurrent recommendation in JSON:")
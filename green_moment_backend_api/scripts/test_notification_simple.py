@@ -12,17 +12,11 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 
-from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 from app.models import User, DeviceToken, NotificationSettings
 from app.services.notification_service import NotificationService
 
-# Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
 
 async def test_with_real_token(user_email: str, fcm_token: str):
     """Test notification with real FCM token from your phone"""
@@ -70,8 +64,8 @@ async def test_with_real_token(user_email: str, fcm_token: str):
         # Send test notification
         print("\n🔔 Sending test notification...")
         
-        result = await NotificationService.send_notification(
-            user_id=str(user.id),
+        result = await NotificationService.send_bulk(
+            user_ids=[user.id],
             body="測試通知：現在是低碳時段！快來使用高耗能家電吧 💚",
             title=None,  # No title as per app design
             data={
@@ -103,12 +97,12 @@ async def main():
     print("\n" + "=" * 50)
     
     # Get user email
-    email = input("\n📧 Enter your Gmail address: ").strip()
+    email = (await asyncio.to_thread(input, "\n📧 Enter your Gmail address: ")).strip()
     
     # Get FCM token
     print("\n📱 Enter the FCM token from your phone")
     print("(You can find this in the app's dashboard - orange debug box)")
-    token = input("Token: ").strip()
+    token = (await asyncio.to_thread(input, "Token: ")).strip()
     
     if not email or not token:
         print("❌ Email and token are required!")
@@ -11,7 +11,8 @@ import asyncio
 import sys
 import os
 from datetime import datetime, timedelta
-from sqlalchemy import select, and_, func, delete
+from sqlalchemy import Float, String, and_, column, delete, func, insert, select, values
+from sqlalchemy.orm import selectinload
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -24,6 +25,26 @@ from app.models.monthly_summary import MonthlySummary
 from app.constants.appliances import APPLIANCE_POWER
 
 
+# APPLIANCE_POWER sent to Postgres once as a VALUES list, so chores can be
+# joined against it and the kW lookup happens set-based in the database
+APPLIANCE_POWER_CTE = select(
+    values(
+        column("appliance", String),
+        column("kw", Float),
+        name="ap"
+    ).data(list(APPLIANCE_POWER.items()))
+).cte("appliance_power")
+
+# Carbon saved by a chore, computed in SQL so it also works as an aggregate
+# (e.g. func.sum over a month of chores). Needs an outer join to
+# APPLIANCE_POWER_CTE on appliance_type: appliance kW (1.0 for unknown
+# appliances) x hours, assuming 0.1 kg CO2 saved per kWh
+CHORE_CARBON_SAVED = (
+    func.coalesce(APPLIANCE_POWER_CTE.c.kw, 1.0)
+    * Chore.duration_minutes / 60.0 * 0.1
+)
+
+
 class PromotionTester:
     def __init__(self):
         self.league_progression = {
@@ -34,13 +55,49 @@ class PromotionTester:
             "diamond": "diamond",  # Max level
         }
     
+    async def _load_last_chore(self, username: str):
+        """Fetch the user's most recent chore and its carbon saved on its own connection
+        
+        Returns a (chore, carbon_saved) row, or None if the user has no chores.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Chore, CHORE_CARBON_SAVED.label("carbon_saved"))
+                .join(User, Chore.user_id == User.id)
+                .outerjoin(
+                    APPLIANCE_POWER_CTE,
+                    Chore.appliance_type == APPLIANCE_POWER_CTE.c.appliance
+                )
+                .where(User.username == username)
+                .order_by(Chore.start_time.desc()).limit(1)
+            )
+            return result.one_or_none()
+    
     async def check_user_promotion(self, username: str):
         """Check if user should be promoted and handle task reset"""
         async with AsyncSessionLocal() as db:
-            # Get user
-            result = await db.execute(
-                select(User).where(User.username == username)
+            # Capture the clock once so every month/year below agrees, even
+            # if the run straddles midnight at a month boundary
+            now = datetime.now()
+            current_month, current_year = now.month, now.year
+            last_month_dt = now.replace(day=1) - timedelta(days=1)
+            last_month, last_year = last_month_dt.month, last_month_dt.year
+            
+            # Get user together with this month's tasks, while the last chore
+            # is fetched concurrently on a second connection
+            user_query = select(User).options(
+                selectinload(
+                    User.user_tasks.and_(
+                        UserTask.month == current_month,
+                        UserTask.year == current_year
+                    )
+                ).joinedload(UserTask.task)
+            ).where(User.username == username)
+            result, last_chore_row = await asyncio.gather(
+                db.execute(user_query),
+                self._load_last_chore(username)
             )
+            last_chore, carbon_saved = last_chore_row or (None, 0)
             user = result.scalar_one_or_none()
             
             if not user:
@@ -51,22 +108,12 @@ class PromotionTester:
             print(f"📊 Current League: {user.current_league}")
             print(f"🌱 Total Carbon Saved: {user.total_carbon_saved:.2f} kg")
             
-            # Get current month tasks for user's league
-            current_month = datetime.now().month
-            current_year = datetime.now().year
-            
-            # Get all user tasks for current month
-            result = await db.execute(
-                select(UserTask, Task).join(Task).where(
-                    and_(
-                        UserTask.user_id == user.id,
-                        UserTask.month == current_month,
-                        UserTask.year == current_year,
-                        Task.league == user.current_league  # Only current league tasks
-                    )
-                )
-            )
-            user_tasks = result.all()
+            # Current month tasks for user's league only
+            user_tasks = [
+                (user_task, user_task.task)
+                for user_task in user.user_tasks
+                if user_task.task.league == user.current_league
+            ]
             
             print(f"\n📋 Current League Tasks ({user.current_league}):")
             completed_count = 0
@@ -95,29 +142,13 @@ class PromotionTester:
                     print(f"\n📌 Not eligible for promotion ({3 - completed_count} more tasks needed)")
             
             # Calculate last month carbon saved from last chore
-            result = await db.execute(
-                select(Chore).where(
-                    Chore.user_id == user.id
-                ).order_by(Chore.start_time.desc()).limit(1)
-            )
-            last_chore = result.scalar_one_or_none()
-            
             if last_chore:
-                # Simple calculation using last chore
-                appliance_kw = APPLIANCE_POWER.get(last_chore.appliance_type, 1.0)
-                duration_hours = last_chore.duration_minutes / 60.0
-                # Assume average savings of 0.1 kg CO2 per kWh
-                carbon_saved = appliance_kw * duration_hours * 0.1
-                
                 print(f"\n🌿 Last Chore Carbon Calculation:")
                 print(f"  Appliance: {last_chore.appliance_type}")
                 print(f"  Duration: {last_chore.duration_minutes} minutes")
                 print(f"  Carbon Saved: {carbon_saved:.3f} kg")
                 
                 # Update or create monthly summary
-                last_month = datetime.now().month - 1 if datetime.now().month > 1 else 12
-                last_year = datetime.now().year if datetime.now().month > 1 else datetime.now().year - 1
-                
                 result = await db.execute(
                     select(MonthlySummary).where(
                         and_(
@@ -158,29 +189,34 @@ class PromotionTester:
                 )
             )
             
-            # Get tasks for user's (potentially new) league
-            result = await db.execute(
-                select(Task).where(
+            # Stream tasks for user's (potentially new) league through a
+            # server-side cursor instead of buffering the whole list
+            print(f"\n🆕 Assigning {user.current_league} league tasks:")
+            new_task_rows = []
+            task_stream = await db.stream(
+                select(Task.id, Task.name, Task.points)
+                .where(
                     and_(
                         Task.league == user.current_league,
                         Task.is_active == True
                     )
                 )
+                .execution_options(yield_per=100)
             )
-            new_tasks = result.scalars().all()
-            
-            print(f"\n🆕 Assigning {user.current_league} league tasks:")
-            for task in new_tasks:
-                user_task = UserTask(
-                    user_id=user.id,
-                    task_id=task.id,
-                    month=current_month,
-                    year=current_year,
-                    completed=False,
-                    points_earned=0
-                )
-                db.add(user_task)
+            async for task in task_stream:
                 print(f"  + {task.name} ({task.points} points)")
+                new_task_rows.append({
+                    "user_id": user.id,
+                    "task_id": task.id,
+                    "month": current_month,
+                    "year": current_year,
+                    "completed": False,
+                    "points_earned": 0
+                })
+            
+            # Single bulk INSERT in the same transaction as the DELETE above
+            if new_task_rows:
+                await db.execute(insert(UserTask), new_task_rows)
             
             # Reset monthly task counter
             user.current_month_tasks_completed = 0
@@ -196,7 +232,7 @@ class PromotionTester:
                 "old_league": old_league,
                 "new_league": user.current_league,
                 "tasks_completed": completed_count,
-                "carbon_saved_last_chore": carbon_saved if last_chore else 0
+                "carbon_saved_last_chore": carbon_saved
             }
 
 
@@ -40,13 +40,41 @@ class PromotionSimulator:
             "diamond": "diamond"
         }
     
+    async def _sum_carbon_for_period(self, username: str, start: date, end: date) -> float:
+        """Sum a user's daily carbon savings over a date range on its own connection"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(func.sum(DailyCarbonProgress.daily_carbon_saved))
+                .join(User, DailyCarbonProgress.user_id == User.id)
+                .where(
+                    and_(
+                        User.username == username,
+                        DailyCarbonProgress.date >= start,
+                        DailyCarbonProgress.date <= end
+                    )
+                )
+            )
+            return result.scalar() or 0
+    
     async def simulate_promotion(self, username: str, use_current_month: bool = False):
         """Simulate promotion without changing the database"""
+        today = date.today()
+        last_month_end = date(today.year, today.month, 1) - relativedelta(days=1)
+        last_month_start = date(last_month_end.year, last_month_end.month, 1)
+        
         async with AsyncSessionLocal() as db:
-            # Get user
-            result = await db.execute(
+            # Get user, and last month's carbon concurrently when it will be needed
+            user_query = db.execute(
                 select(User).where(User.username == username)
             )
+            if use_current_month:
+                result = await user_query
+                last_month_carbon = None
+            else:
+                result, last_month_carbon = await asyncio.gather(
+                    user_query,
+                    self._sum_carbon_for_period(username, last_month_start, last_month_end)
+                )
             user = result.scalar_one_or_none()
             
             if not user:
@@ -77,21 +105,7 @@ class PromotionSimulator:
                 print(f"🌿 Carbon Saved: {carbon_amount:.2f} g")
             else:
                 # Normal: use last completed month
-                today = date.today()
-                last_month_end = date(today.year, today.month, 1) - relativedelta(days=1)
-                last_month_start = date(last_month_end.year, last_month_end.month, 1)
-                
-                # Calculate last month's carbon
-                result = await db.execute(
-                    select(func.sum(DailyCarbonProgress.daily_carbon_saved)).where(
-                        and_(
-                            DailyCarbonProgress.user_id == user.id,
-                            DailyCarbonProgress.date >= last_month_start,
-                            DailyCarbonProgress.date <= last_month_end
-                        )
-                    )
-                )
-                carbon_amount = result.scalar() or 0
+                carbon_amount = last_month_carbon
                 check_month = last_month_end
                 print(f"\n📅 Checking: {check_month.strftime('%B %Y')}")
                 print(f"🌿 Carbon Saved: {carbon_amount:.2f} g")
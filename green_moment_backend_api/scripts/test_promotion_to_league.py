@@ -10,8 +10,9 @@ from datetime import datetime
 # Add parent directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import select, and_
-from app.core.database import AsyncSessionLocal
+from sqlalchemy import bindparam, case, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.database import engine
 from app.models.user import User
 from app.models.monthly_summary import MonthlySummary
 
@@ -26,14 +27,27 @@ LEAGUE_PROGRESSION = {
 }
 
 
+# Built once and reused; the username is bound per call
+_USER_BY_NAME = select(
+    User.id,
+    User.username,
+    User.current_league,
+    User.current_month_carbon_saved
+).where(User.username == bindparam("username"))
+
+
 async def promote_to_league(username: str, target_league: str):
     """Promote user to specific league for testing"""
-    async with AsyncSessionLocal() as db:
+    # Read the clock once so the summary row and its conflict key agree
+    now = datetime.now()
+    current_month, current_year = now.month, now.year
+    
+    # A single Core transaction: these few statements don't need the ORM
+    # unit of work
+    async with engine.begin() as conn:
         # Get user
-        result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        user = result.scalar_one_or_none()
+        result = await conn.execute(_USER_BY_NAME, {"username": username})
+        user = result.one_or_none()
         
         if not user:
             print(f"❌ User '{username}' not found")
@@ -54,50 +68,125 @@ async def promote_to_league(username: str, target_league: str):
             
         # Update user league
         old_league = user.current_league
-        user.current_league = target_league
+        await conn.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(current_league=target_league)
+        )
         
         # DO NOT modify carbon values - keep the actual data!
         # This is just a test promotion
         
-        # Create or update current month summary with promotion flag
-        result = await db.execute(
-            select(MonthlySummary).where(
-                and_(
-                    MonthlySummary.user_id == user.id,
-                    MonthlySummary.month == datetime.now().month,
-                    MonthlySummary.year == datetime.now().year
-                )
+        # Create or update current month summary with promotion flag in
+        # one upsert; an existing summary keeps its carbon value
+        stmt = pg_insert(MonthlySummary).values(
+            user_id=user.id,
+            month=current_month,
+            year=current_year,
+            total_carbon_saved=user.current_month_carbon_saved,
+            total_chores_logged=0,
+            total_hours_shifted=0.0,
+            tasks_completed=0,
+            total_points_earned=0,
+            league_at_month_start=old_league,
+            league_at_month_end=target_league,
+            league_upgraded=True  # This triggers the animation!
+        )
+        await conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[MonthlySummary.user_id, MonthlySummary.month, MonthlySummary.year],
+                set_={
+                    "league_at_month_end": stmt.excluded.league_at_month_end,
+                    "league_upgraded": True
+                }
             )
         )
-        summary = result.scalar_one_or_none()
-        
-        if not summary:
-            summary = MonthlySummary(
-                user_id=user.id,
-                month=datetime.now().month,
-                year=datetime.now().year,
-                total_carbon_saved=user.current_month_carbon_saved,
-                total_chores_logged=0,
-                total_hours_shifted=0.0,
-                tasks_completed=0,
-                total_points_earned=0,
-                league_at_month_start=old_league,
-                league_at_month_end=target_league,
-                league_upgraded=True  # This triggers the animation!
+    
+    print(f"\n🎉 PROMOTED to {target_league} league!")
+    print(f"  - From: {old_league}")
+    print(f"  - To: {target_league}")
+    print(f"  - Animation flag: Set to True")
+    print(f"\n📱 Now close and reopen the app to see the animation!")
+
+
+async def promote_many(targets: list[tuple[str, str]]):
+    """Promote several users, each to its own league, in one transaction
+    
+    targets is a list of (username, target_league) pairs. All league
+    changes go out as one UPDATE and all summaries as one upsert.
+    """
+    invalid = sorted({league for _, league in targets if league not in LEAGUE_PROGRESSION})
+    if invalid:
+        print(f"❌ Invalid league(s): {', '.join(invalid)}")
+        print(f"   Valid leagues: bronze, silver, gold, emerald, diamond")
+        return
+    
+    target_by_name = dict(targets)
+    now = datetime.now()
+    current_month, current_year = now.month, now.year
+    
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            select(
+                User.id,
+                User.username,
+                User.current_league,
+                User.current_month_carbon_saved
             )
-            db.add(summary)
-        else:
-            summary.league_at_month_end = target_league
-            summary.league_upgraded = True
-            # Keep the existing carbon value, don't modify it
+            .where(User.username.in_(list(target_by_name)))
+        )
+        users = result.all()
+        
+        missing = set(target_by_name) - {user.username for user in users}
+        for username in sorted(missing):
+            print(f"❌ User '{username}' not found")
+        
+        to_promote = [
+            user for user in users
+            if user.current_league != target_by_name[user.username]
+        ]
+        if not to_promote:
+            print("⚠️  No users need promoting")
+            return
         
-        await db.commit()
+        # Per-user target league chosen by a CASE on the user id
+        await conn.execute(
+            update(User)
+            .where(User.id.in_([user.id for user in to_promote]))
+            .values(current_league=case(
+                {user.id: target_by_name[user.username] for user in to_promote},
+                value=User.id
+            ))
+        )
         
-        print(f"\n🎉 PROMOTED to {target_league} league!")
-        print(f"  - From: {old_league}")
-        print(f"  - To: {target_league}")
-        print(f"  - Animation flag: Set to True")
-        print(f"\n📱 Now close and reopen the app to see the animation!")
+        stmt = pg_insert(MonthlySummary).values([
+            {
+                "user_id": user.id,
+                "month": current_month,
+                "year": current_year,
+                "total_carbon_saved": user.current_month_carbon_saved,
+                "total_chores_logged": 0,
+                "total_hours_shifted": 0.0,
+                "tasks_completed": 0,
+                "total_points_earned": 0,
+                "league_at_month_start": user.current_league,
+                "league_at_month_end": target_by_name[user.username],
+                "league_upgraded": True
+            }
+            for user in to_promote
+        ])
+        await conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[MonthlySummary.user_id, MonthlySummary.month, MonthlySummary.year],
+                set_={
+                    "league_at_month_end": stmt.excluded.league_at_month_end,
+                    "league_upgraded": True
+                }
+            )
+        )
+    
+    for user in to_promote:
+        print(f"🎉 {user.username}: {user.current_league} → {target_by_name[user.username]}")
 
 
 async def list_leagues():
@@ -111,8 +200,17 @@ async def list_leagues():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--many":
+        targets = []
+        for pair in sys.argv[2:]:
+            username, _, league = pair.partition(":")
+            targets.append((username, league.lower()))
+        asyncio.run(promote_many(targets))
+        sys.exit(0)
+    
     if len(sys.argv) != 3:
         print("Usage: python test_promotion_to_league.py <username> <target_league>")
+        print("       python test_promotion_to_league.py --many <username>:<league> ...")
         print("Example: python test_promotion_to_league.py edwards_test1 silver")
         asyncio.run(list_leagues())
         sys.exit(1)
@@ -7,10 +7,12 @@ Actually promotes the user but saves state for easy reversion
 import asyncio
 import sys
 import os
-import json
 from datetime import datetime, date
 from pathlib import Path
-from sqlalchemy import select, and_
+import orjson
+from sqlalchemy import bindparam, select, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -19,6 +21,21 @@ from app.models.user import User
 from app.models.monthly_summary import MonthlySummary
 
 
+# Built once and reused; username and period are bound per call
+_USER_WITH_SUMMARY = (
+    select(User, MonthlySummary)
+    .outerjoin(
+        MonthlySummary,
+        and_(
+            MonthlySummary.user_id == User.id,
+            MonthlySummary.month == bindparam("month"),
+            MonthlySummary.year == bindparam("year")
+        )
+    )
+    .where(User.username == bindparam("username"))
+)
+
+
 class PromotionTester:
     def __init__(self):
         self.backup_file = Path("test_promotion_backup.json")
@@ -37,76 +54,63 @@ class PromotionTester:
             "diamond": None    # Max level
         }
     
-    async def backup_user_state(self, username: str):
-        """Backup user state before promotion"""
-        async with AsyncSessionLocal() as db:
-            # Get user
-            result = await db.execute(
-                select(User).where(User.username == username)
-            )
-            user = result.scalar_one_or_none()
-            
-            if not user:
-                print(f"❌ User '{username}' not found!")
-                return False
-            
-            # Save current state
-            backup_data = {
-                "username": username,
-                "user_id": user.id,
-                "original_league": user.current_league,
-                "original_total_carbon": float(user.total_carbon_saved),
-                "original_month_carbon": float(user.current_month_carbon_saved),
-                "backup_time": datetime.now().isoformat()
-            }
-            
-            # Check if there's an existing monthly summary
-            current_month = date.today().month
-            current_year = date.today().year
-            
-            result = await db.execute(
-                select(MonthlySummary).where(
-                    and_(
-                        MonthlySummary.user_id == user.id,
-                        MonthlySummary.month == current_month,
-                        MonthlySummary.year == current_year
-                    )
-                )
-            )
-            summary = result.scalar_one_or_none()
-            
-            if summary:
-                backup_data["had_monthly_summary"] = True
-                backup_data["summary_id"] = summary.id
-                backup_data["summary_carbon"] = float(summary.total_carbon_saved)
-                backup_data["summary_league_start"] = summary.league_at_month_start
-                backup_data["summary_league_end"] = summary.league_at_month_end
-                backup_data["summary_upgraded"] = summary.league_upgraded
-            else:
-                backup_data["had_monthly_summary"] = False
-            
-            # Write backup
-            with open(self.backup_file, 'w') as f:
-                json.dump(backup_data, f, indent=2)
-            
-            print(f"✅ Backed up state to {self.backup_file}")
-            return True
+    async def backup_user_state(self, db, username: str, current_month: int, current_year: int):
+        """Backup user state before promotion
+        
+        Loads the user and this month's summary in one query and returns
+        (user, summary) so the caller can reuse them, or None if the user
+        does not exist.
+        """
+        result = await db.execute(
+            _USER_WITH_SUMMARY,
+            {"username": username, "month": current_month, "year": current_year}
+        )
+        row = result.one_or_none()
+        
+        if not row:
+            print(f"❌ User '{username}' not found!")
+            return None
+        
+        user, summary = row
+        
+        # Save current state
+        backup_data = {
+            "username": username,
+            "user_id": user.id,
+            "original_league": user.current_league,
+            "original_total_carbon": float(user.total_carbon_saved),
+            "original_month_carbon": float(user.current_month_carbon_saved),
+            "backup_time": datetime.now().isoformat()
+        }
+        
+        # Record the existing monthly summary, if any
+        if summary:
+            backup_data["had_monthly_summary"] = True
+            backup_data["summary_id"] = summary.id
+            backup_data["summary_carbon"] = float(summary.total_carbon_saved)
+            backup_data["summary_league_start"] = summary.league_at_month_start
+            backup_data["summary_league_end"] = summary.league_at_month_end
+            backup_data["summary_upgraded"] = summary.league_upgraded
+        else:
+            backup_data["had_monthly_summary"] = False
+        
+        # Write backup
+        self.backup_file.write_bytes(orjson.dumps(backup_data))
+        
+        print(f"✅ Backed up state to {self.backup_file}")
+        return user, summary
     
     async def test_promote_user(self, username: str):
         """Test promote user based on current month carbon"""
-        # First, backup the state
-        if not await self.backup_user_state(username):
-            return
+        today = date.today()
+        current_month, current_year = today.month, today.year
         
         async with AsyncSessionLocal() as db:
-            # Get user
-            result = await db.execute(
-                select(User).where(User.username == username)
-            )
-            user = result.scalar_one_or_none()
-            
-            if not user:
+            # First, backup the state; the loaded rows are reused below
+            loaded = await self.backup_user_state(db, username, current_month, current_year)
+            if not loaded:
                 return
+            user, _ = loaded
             
             print(f"\n🧪 TEST PROMOTION for {user.username}")
             print(f"📊 Current State:")
@@ -127,36 +131,26 @@ class PromotionTester:
                 new_league = self.league_progression[old_league]
                 user.current_league = new_league
                 
-                # Create/update monthly summary
-                current_month = date.today().month
-                current_year = date.today().year
-                
-                result = await db.execute(
-                    select(MonthlySummary).where(
-                        and_(
-                            MonthlySummary.user_id == user.id,
-                            MonthlySummary.month == current_month,
-                            MonthlySummary.year == current_year
-                        )
-                    )
+                # Create/update monthly summary in one upsert
+                stmt = pg_insert(MonthlySummary).values(
+                    user_id=user.id,
+                    month=current_month,
+                    year=current_year,
+                    total_carbon_saved=user.current_month_carbon_saved,
+                    league_at_month_start=old_league,
+                    league_at_month_end=new_league,
+                    league_upgraded=True
                 )
-                summary = result.scalar_one_or_none()
-                
-                if not summary:
-                    summary = MonthlySummary(
-                        user_id=user.id,
-                        month=current_month,
-                        year=current_year,
-                        total_carbon_saved=user.current_month_carbon_saved,
-                        league_at_month_start=old_league,
-                        league_at_month_end=new_league,
-                        league_upgraded=True
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[MonthlySummary.user_id, MonthlySummary.month, MonthlySummary.year],
+                        set_={
+                            "total_carbon_saved": stmt.excluded.total_carbon_saved,
+                            "league_at_month_end": stmt.excluded.league_at_month_end,
+                            "league_upgraded": True
+                        }
                     )
-                    db.add(summary)
-                else:
-                    summary.total_carbon_saved = user.current_month_carbon_saved
-                    summary.league_at_month_end = new_league
-                    summary.league_upgraded = True
+                )
                 
                 await db.commit()
                 
@@ -175,16 +169,22 @@ class PromotionTester:
             return
         
         # Load backup
-        with open(self.backup_file, 'r') as f:
-            backup = json.load(f)
+        backup = orjson.loads(self.backup_file.read_bytes())
         
         print(f"\n🔄 Rolling back promotion for {backup['username']}")
         print(f"📅 Backup from: {backup['backup_time']}")
         
+        today = date.today()
+        
         async with AsyncSessionLocal() as db:
-            # Get user
+            # Get user with only this month's summary eager-loaded
             result = await db.execute(
-                select(User).where(User.username == backup['username'])
+                select(User)
+                .options(selectinload(User.monthly_summaries.and_(
+                    MonthlySummary.month == today.month,
+                    MonthlySummary.year == today.year
+                )))
+                .where(User.username == backup['username'])
             )
             user = result.scalar_one_or_none()
             
@@ -201,13 +201,9 @@ class PromotionTester:
             
             # Handle monthly summary
             if backup.get('had_monthly_summary'):
-                # Restore existing summary
-                result = await db.execute(
-                    select(MonthlySummary).where(
-                        MonthlySummary.id == backup['summary_id']
-                    )
-                )
-                summary = result.scalar_one_or_none()
+                # Restore existing summary (already in the identity map if it
+                # is this month's, which the query above loaded)
+                summary = await db.get(MonthlySummary, backup['summary_id'])
                 
                 if summary:
                     summary.total_carbon_saved = backup['summary_carbon']
@@ -216,19 +212,7 @@ class PromotionTester:
                     summary.league_upgraded = backup['summary_upgraded']
             else:
                 # Delete any summary created during test
-                current_month = date.today().month
-                current_year = date.today().year
-                
-                result = await db.execute(
-                    select(MonthlySummary).where(
-                        and_(
-                            MonthlySummary.user_id == user.id,
-                            MonthlySummary.month == current_month,
-                            MonthlySummary.year == current_year
-                        )
-                    )
-                )
-                summary = result.scalar_one_or_none()
+                summary = next(iter(user.monthly_summaries), None)
                 
                 if summary:
                     await db.delete(summary)
@@ -4,6 +4,7 @@ Test promotion based on carbon threshold achievement
 Can promote up based on thresholds or reset to bronze without data loss
 """
 import asyncio
+import bisect
 import sys
 import os
 from datetime import datetime
@@ -11,8 +12,9 @@ from datetime import datetime
 # Add parent directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import select, and_
-from app.core.database import AsyncSessionLocal
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.database import engine
 from app.models.user import User
 from app.models.monthly_summary import MonthlySummary
 
@@ -27,16 +29,35 @@ LEAGUE_THRESHOLDS = {
 }
 
 LEAGUE_ORDER = ['bronze', 'silver', 'gold', 'emerald', 'diamond']
+LEAGUE_RANK = {league: rank for rank, league in enumerate(LEAGUE_ORDER)}
+
+# Thresholds in league order (ascending); the number of thresholds reached
+# is the rank of the league a carbon total qualifies for
+PROMOTION_THRESHOLDS = [LEAGUE_THRESHOLDS[league] for league in LEAGUE_ORDER[:-1]]
+
+
+# Built once and reused; the username is bound per call
+_USER_BY_NAME = select(
+    User.id,
+    User.username,
+    User.current_league,
+    User.current_month_carbon_saved,
+    User.total_carbon_saved
+).where(User.username == bindparam("username"))
 
 
 async def check_and_promote_based_on_threshold(username: str, reset_to_bronze: bool = False):
     """Check user's carbon and promote based on thresholds, or reset to bronze"""
-    async with AsyncSessionLocal() as db:
+    # Read the clock once so the summary row and its conflict key agree
+    now = datetime.now()
+    current_month, current_year = now.month, now.year
+    
+    # A single Core transaction: these few statements don't need the ORM
+    # unit of work
+    async with engine.begin() as conn:
         # Get user
-        result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        user = result.scalar_one_or_none()
+        result = await conn.execute(_USER_BY_NAME, {"username": username})
+        user = result.one_or_none()
         
         if not user:
             print(f"❌ User '{username}' not found")
@@ -51,25 +72,21 @@ async def check_and_promote_based_on_threshold(username: str, reset_to_bronze: b
         if reset_to_bronze:
             # Reset to bronze without clearing data
             print(f"\n🔄 Resetting to bronze league...")
-            user.current_league = 'bronze'
-            await db.commit()
+            await conn.execute(
+                update(User)
+                .where(User.id == user.id)
+                .values(current_league='bronze')
+            )
             print(f"✅ Reset to bronze (carbon data preserved)")
             return
         
         # Check what league user should be in based on current month carbon
         current_carbon = user.current_month_carbon_saved
-        current_league_index = LEAGUE_ORDER.index(user.current_league)
+        current_league_index = LEAGUE_RANK[user.current_league]
         
         # Find highest league user qualifies for
-        qualified_league = 'bronze'
-        for i, league in enumerate(LEAGUE_ORDER[:-1]):  # Skip diamond
-            threshold = LEAGUE_THRESHOLDS[league]
-            if current_carbon >= threshold:
-                qualified_league = LEAGUE_ORDER[i + 1]
-            else:
-                break
-                
-        qualified_league_index = LEAGUE_ORDER.index(qualified_league)
+        qualified_league_index = bisect.bisect_right(PROMOTION_THRESHOLDS, current_carbon)
+        qualified_league = LEAGUE_ORDER[qualified_league_index]
         
         print(f"\n🎯 Threshold Analysis:")
         print(f"  - Current carbon: {current_carbon:.1f}g")
@@ -80,41 +97,37 @@ async def check_and_promote_based_on_threshold(username: str, reset_to_bronze: b
             print(f"\n🎉 PROMOTING from {user.current_league} to {qualified_league}!")
             
             old_league = user.current_league
-            user.current_league = qualified_league
-            
-            # Create or update monthly summary with promotion flag
-            result = await db.execute(
-                select(MonthlySummary).where(
-                    and_(
-                        MonthlySummary.user_id == user.id,
-                        MonthlySummary.month == datetime.now().month,
-                        MonthlySummary.year == datetime.now().year
-                    )
-                )
+            await conn.execute(
+                update(User)
+                .where(User.id == user.id)
+                .values(current_league=qualified_league)
             )
-            summary = result.scalar_one_or_none()
             
-            if not summary:
-                summary = MonthlySummary(
-                    user_id=user.id,
-                    month=datetime.now().month,
-                    year=datetime.now().year,
-                    total_carbon_saved=user.current_month_carbon_saved,
-                    total_chores_logged=0,
-                    total_hours_shifted=0.0,
-                    tasks_completed=0,
-                    total_points_earned=0,
-                    league_at_month_start=old_league,
-                    league_at_month_end=qualified_league,
-                    league_upgraded=True  # This triggers the animation!
+            # Create or update monthly summary with promotion flag in one upsert
+            stmt = pg_insert(MonthlySummary).values(
+                user_id=user.id,
+                month=current_month,
+                year=current_year,
+                total_carbon_saved=user.current_month_carbon_saved,
+                total_chores_logged=0,
+                total_hours_shifted=0.0,
+                tasks_completed=0,
+                total_points_earned=0,
+                league_at_month_start=old_league,
+                league_at_month_end=qualified_league,
+                league_upgraded=True  # This triggers the animation!
+            )
+            await conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MonthlySummary.user_id, MonthlySummary.month, MonthlySummary.year],
+                    set_={
+                        "league_at_month_end": stmt.excluded.league_at_month_end,
+                        "league_upgraded": True,
+                        "total_carbon_saved": stmt.excluded.total_carbon_saved
+                    }
                 )
-                db.add(summary)
-            else:
-                summary.league_at_month_end = qualified_league
-                summary.league_upgraded = True
-                summary.total_carbon_saved = user.current_month_carbon_saved
+            )
             
-            await db.commit()
             print(f"✅ Promotion complete! Close and reopen app to see animation.")
             
         elif qualified_league_index == current_league_index:
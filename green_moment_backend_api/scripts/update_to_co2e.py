@@ -2,26 +2,59 @@
 """
 Update all CO2 references to CO2e throughout the system
 """
-import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def update_json_keys(data):
-    """Recursively update JSON keys from CO2 to CO2e"""
-    if isinstance(data, dict):
-        new_data = {}
-        for key, value in data.items():
-            # Update key if it contains CO2 but not CO2e
-            new_key = key
-            if 'CO2' in key and 'CO2e' not in key:
-                new_key = key.replace('gCO2_kWh', 'gCO2e_kWh').replace('gCO2_kwh', 'gCO2e_kWh')
-            new_data[new_key] = update_json_keys(value)
-        return new_data
-    elif isinstance(data, list):
-        return [update_json_keys(item) for item in data]
-    else:
-        return data
+import orjson
+
+def update_json_keys(root):
+    """Update JSON keys from CO2 to CO2e in place
+    
+    Walks the parsed structure with an explicit stack instead of recursing
+    and building a copy of every dict and list.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            # Update keys that contain CO2 but not CO2e
+            if any('CO2' in key and 'CO2e' not in key for key in node):
+                items = list(node.items())
+                node.clear()
+                for key, value in items:
+                    if 'CO2' in key and 'CO2e' not in key:
+                        key = key.replace('gCO2_kWh', 'gCO2e_kWh').replace('gCO2_kwh', 'gCO2e_kWh')
+                    node[key] = value
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(item for item in node if isinstance(item, (dict, list)))
+
+CO2E_REPLACEMENTS = [
+    # Update gCO2_kWh to gCO2e_kWh
+    (r"gCO2_kWh", "gCO2e_kWh"),
+    (r"gCO2_kwh", "gCO2e_kWh"),
+    (r"gCO2/kWh", "gCO2e/kWh"),
+    
+    # Update kg CO2 to kg CO2e (in comments)
+    (r"kg CO2(?!e)", "kg CO2e"),
+    (r"kgCO2/kWh", "kgCO2e/kWh"),
+    (r"kgCO2_kWh", "kgCO2e_kWh"),
+    
+    # Update carbon intensity comments
+    (r"carbon intensity \(CO2\)", "carbon intensity (CO2e)"),
+    (r"Carbon intensity: CO2", "Carbon intensity: CO2e"),
+]
+
+# All replacements folded into one alternation so each file is scanned once;
+# the matching group's index selects its replacement
+CO2E_PATTERN = re.compile(
+    '|'.join(f'(?P<r{i}>{pattern})' for i, (pattern, _) in enumerate(CO2E_REPLACEMENTS))
+)
+
+def _co2e_replacement(match):
+    return CO2E_REPLACEMENTS[int(match.lastgroup[1:])][1]
 
 def update_carbon_intensity_json():
     """Update carbon intensity JSON file to use CO2e"""
@@ -29,36 +62,44 @@ def update_carbon_intensity_json():
     
     if json_path.exists():
         print("📄 Updating carbon intensity JSON...")
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        data = orjson.loads(json_path.read_bytes())
         
         # Update all keys
-        updated_data = update_json_keys(data)
+        update_json_keys(data)
         
         # Write back
-        with open(json_path, 'w') as f:
-            json.dump(updated_data, f, indent=2)
+        json_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         
         print("✅ Updated carbon intensity JSON to use CO2e")
 
+def update_python_file(file_path):
+    """Rewrite one file to use CO2e
+    
+    Returns True if the file changed, False if not, None if it does not exist.
+    """
+    if not Path(file_path).exists():
+        return None
+    
+    # Every replacement pattern contains "CO2", so a raw byte scan rules out
+    # most files before they are decoded and run through the regex
+    raw = Path(file_path).read_bytes()
+    if b'CO2' not in raw:
+        return False
+    
+    content = raw.decode()
+    
+    original_content = content
+    content = CO2E_PATTERN.sub(_co2e_replacement, content)
+    
+    if content == original_content:
+        return False
+    
+    with open(file_path, 'w') as f:
+        f.write(content)
+    return True
+
 def update_python_files():
     """Update Python files to use CO2e"""
-    replacements = [
-        # Update gCO2_kWh to gCO2e_kWh
-        (r"gCO2_kWh", "gCO2e_kWh"),
-        (r"gCO2_kwh", "gCO2e_kWh"),
-        (r"gCO2/kWh", "gCO2e/kWh"),
-        
-        # Update kg CO2 to kg CO2e (in comments)
-        (r"kg CO2(?!e)", "kg CO2e"),
-        (r"kgCO2/kWh", "kgCO2e/kWh"),
-        (r"kgCO2_kWh", "kgCO2e_kWh"),
-        
-        # Update carbon intensity comments
-        (r"carbon intensity \(CO2\)", "carbon intensity (CO2e)"),
-        (r"Carbon intensity: CO2", "Carbon intensity: CO2e"),
-    ]
-    
     files_to_update = [
         "scripts/carbon_intensity_generator.py",
         "scripts/inspect_model_features.py",
@@ -73,19 +114,14 @@ def update_python_files():
         "check_user_data.py",
     ]
     
-    for file_path in files_to_update:
-        if Path(file_path).exists():
+    # The files are independent, so overlap their disk I/O; map keeps the
+    # report in list order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for file_path, status in zip(files_to_update, executor.map(update_python_file, files_to_update)):
+            if status is None:
+                continue
             print(f"📝 Updating {file_path}...")
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            original_content = content
-            for pattern, replacement in replacements:
-                content = re.sub(pattern, replacement, content)
-            
-            if content != original_content:
-                with open(file_path, 'w') as f:
-                    f.write(content)
+            if status:
                 print(f"✅ Updated {file_path}")
             else:
                 print(f"⏭️  No changes needed in {file_path}")
@@ -2,17 +2,20 @@
 """
 Verify that Storage is properly excluded from carbon intensity calculations
 """
-import json
 from pathlib import Path
-import pandas as pd
 
-def verify_json_output():
+import ijson
+import orjson
+
+# Backend API root, so the checks don't depend on the working directory
+ROOT = Path(__file__).resolve().parent.parent
+JSON_PATH = ROOT / "data" / "carbon_intensity_debug.json"
+LOG_PATH = ROOT / "logs" / "carbon_calculation_log.json"
+
+def verify_json_output(json_path: Path = JSON_PATH):
     """Check the carbon intensity JSON output"""
-    json_path = Path("data/carbon_intensity_debug.json")
-    
     if json_path.exists():
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        data = orjson.loads(json_path.read_bytes())
         
         current = data.get('current', {})
         total_gen = current.get('total_generation_mw', 0)
@@ -20,83 +23,91 @@ def verify_json_output():
         generation_mix = current.get('generation_mix', {})
         
         # Calculate expected total (excluding Storage)
-        expected_total = sum(mw for fuel, mw in generation_mw.items() if fuel != 'Storage')
+        expected_total = sum(generation_mw.values()) - generation_mw.get('Storage', 0.0)
         
-        print("Carbon Intensity Output Verification")
-        print("=" * 50)
-        print(f"Total Generation (reported): {total_gen:.2f} MW")
-        print(f"Total Generation (calculated without Storage): {expected_total:.2f} MW")
+        # Collect the report and write it in one go
+        lines = [
+            "Carbon Intensity Output Verification",
+            "=" * 50,
+            f"Total Generation (reported): {total_gen:.2f} MW",
+            f"Total Generation (calculated without Storage): {expected_total:.2f} MW",
+        ]
         
         if 'Storage' in generation_mw:
-            print(f"Storage Generation: {generation_mw['Storage']:.2f} MW")
-            print(f"Storage in generation_mix: {'Yes' if 'Storage' in generation_mix else 'No'}")
+            lines.append(f"Storage Generation: {generation_mw['Storage']:.2f} MW")
+            lines.append(f"Storage in generation_mix: {'Yes' if 'Storage' in generation_mix else 'No'}")
         
         # Verify the total matches expected
         if abs(total_gen - expected_total) < 0.01:
-            print("\n✓ CORRECT: Total generation excludes Storage")
+            lines.append("\n✓ CORRECT: Total generation excludes Storage")
         else:
-            print("\n✗ ERROR: Total generation includes Storage!")
+            lines.append("\n✗ ERROR: Total generation includes Storage!")
         
         # Verify generation mix percentages
         if generation_mix:
             mix_total = sum(generation_mix.values())
-            print(f"\nGeneration mix total: {mix_total:.2f}%")
+            lines.append(f"\nGeneration mix total: {mix_total:.2f}%")
             if abs(mix_total - 100) < 0.1:
-                print("✓ CORRECT: Generation mix totals to 100%")
+                lines.append("✓ CORRECT: Generation mix totals to 100%")
             else:
-                print("✗ ERROR: Generation mix does not total to 100%")
+                lines.append("✗ ERROR: Generation mix does not total to 100%")
+        
+        print("\n".join(lines))
 
-def verify_calculation_log():
+def verify_calculation_log(log_path: Path = LOG_PATH):
     """Check the carbon calculation log"""
-    log_path = Path("logs/carbon_calculation_log.json")
-    
     if log_path.exists():
-        with open(log_path, 'r') as f:
-            data = json.load(f)
-        
-        print("\n" + "=" * 50)
-        print("Carbon Calculation Log Verification")
-        print("=" * 50)
+        # Stream just the two top-level sections we check; each pass stops
+        # as soon as its section has been built
+        with open(log_path, 'rb') as f:
+            fuel_details = next(ijson.items(f, 'fuel_details', use_float=True), {})
+        with open(log_path, 'rb') as f:
+            regional = next(ijson.items(f, 'regional_breakdown', use_float=True), {})
         
-        summary = data.get('summary', {})
-        fuel_details = data.get('fuel_details', {})
+        # Collect the report and write it in one go
+        lines = [
+            "\n" + "=" * 50,
+            "Carbon Calculation Log Verification",
+            "=" * 50,
+        ]
         
         if 'Storage' in fuel_details:
             storage = fuel_details['Storage']
-            print(f"Storage in fuel_details: Yes")
-            print(f"Storage emissions calculation: {storage.get('emissions_calculation', 'N/A')}")
-            print(f"Storage note: {storage.get('note', 'N/A')}")
+            lines.append(f"Storage in fuel_details: Yes")
+            lines.append(f"Storage emissions calculation: {storage.get('emissions_calculation', 'N/A')}")
+            lines.append(f"Storage note: {storage.get('note', 'N/A')}")
         else:
-            print("Storage in fuel_details: No")
+            lines.append("Storage in fuel_details: No")
         
         # Check if Storage appears in regional breakdown
-        regional = data.get('regional_breakdown', {})
         storage_found = False
         for region, fuels in regional.items():
             if 'Storage' in fuels:
                 storage_found = True
-                print(f"\n✗ Storage found in {region} regional breakdown!")
+                lines.append(f"\n✗ Storage found in {region} regional breakdown!")
         
         if not storage_found:
-            print("\n✓ CORRECT: Storage excluded from regional breakdowns")
+            lines.append("\n✓ CORRECT: Storage excluded from regional breakdowns")
+        
+        print("\n".join(lines))
 
 def main():
     print("Storage Exclusion Verification")
     print("=" * 80)
     
-    verify_json_output()
-    verify_calculation_log()
+    verify_json_output(JSON_PATH)
+    verify_calculation_log(LOG_PATH)
     
-    print("\n" + "=" * 80)
-    print("Summary:")
-    print("- Storage should NOT be in total_generation_mw")
-    print("- Storage should NOT be in generation_mix percentages")
-    print("- Storage should NOT be in regional_breakdown")
-    print("- Storage CAN be in generation_mw for transparency")
-    print("- Storage CAN be in fuel_details with 'EXCLUDED' note")
+    print(
+        "\n" + "=" * 80,
+        "Summary:",
+        "- Storage should NOT be in total_generation_mw",
+        "- Storage should NOT be in generation_mix percentages",
+        "- Storage should NOT be in regional_breakdown",
+        "- Storage CAN be in generation_mw for transparency",
+        "- Storage CAN be in fuel_details with 'EXCLUDED' note",
+        sep="\n"
+    )
 
 if __name__ == "__main__":
-    # Change to backend API directory
-    import os
-    os.chdir(Path(__file__).parent.parent)
     main()
\ No newline at end of file
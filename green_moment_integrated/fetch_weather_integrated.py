@@ -5,8 +5,11 @@
 #   - Updates regional CSV files with weather data
 #   - Synchronizes with generation data using timestamps
 # ==============================================================================
+import io
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 from pathlib import Path
 from dotenv import load_dotenv
@@ -14,8 +17,8 @@ from datetime import datetime
 import csv
 import time
 import fcntl
-import pandas as pd
-import sys
+import numpy as np
+import orjson
 
 # --- Configuration ---
 load_dotenv()
@@ -26,11 +29,26 @@ if not CWA_API_KEY:
 # API endpoint for real-time observations
 BASE_API_URL = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0003-001"
 
+# One keep-alive session per run, retrying transient gateway errors
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
 # Define paths
 BASE_DIR = Path(__file__).parent
 STRU_DATA_DIR = BASE_DIR / "stru_data"
 LOGS_DIR = BASE_DIR / "logs"
 WEATHER_LOG_FILE = LOGS_DIR / "10min_weather_log.csv"
+WEATHER_LOG_FIELDS = ["Timestamp", "StationName", "AirTemperature", "WindSpeed", "SunshineDuration", "Precipitation", "HasNullValue"]
+ALL_STATIONS_FILE = STRU_DATA_DIR / "all_stations_weather.csv"
+ALL_STATIONS_LASTTS_FILE = STRU_DATA_DIR / "all_stations_weather.lastts"
+
+# Latest Timestamp per regional CSV, keyed by path and checked against the
+# file's (st_mtime_ns, st_size) so unchanged files are not re-read
+_latest_ts_cache = {}
 
 # Stations relevant to power generation, grouped by region
 # 北部地區 (North) - 涵蓋主要都會區、沿海地區（風力發電）及主要空港
@@ -59,11 +77,22 @@ STATIONS_BY_REGION = {
     ]
 }
 
+# Region of every tracked station, for O(1) filtering and bucketing
+_STATION_TO_REGION = {
+    station: region
+    for region, station_list in STATIONS_BY_REGION.items()
+    for station in station_list
+}
+
+# Per-station regional debug output is only printed when GREEN_DEBUG=1
+DEBUG_REGIONAL = os.getenv("GREEN_DEBUG") == "1"
+
 # Fields to extract and average
 TARGET_FIELDS = ["SunshineDuration", "AirTemperature", "WindSpeed", "Precipitation"]
 
 # All fields to extract for comprehensive station data
 ALL_STATION_FIELDS = ["AirTemperature", "WindSpeed", "SunshineDuration", "Precipitation", "UVIndex", "WindDirection"]
+_STATION_FIELD_POS = {field: i for i, field in enumerate(ALL_STATION_FIELDS)}
 
 # --- Helper Functions ---
 def ensure_directories():
@@ -73,49 +102,72 @@ def ensure_directories():
 
 def safe_float_convert(value):
     """Safely converts a value to float, handling CWA's null identifiers."""
+    if value is None:
+        return None
     try:
-        if float(value) < -90:
-            return None
-        return float(value)
+        number = float(value)
     except (ValueError, TypeError):
         return None
+    return None if number < -90 else number
 
 def fetch_weather_data():
     """Fetches the latest weather observation data from the CWA API."""
     params = {"Authorization": CWA_API_KEY}
     print(f"📡 [{datetime.now().strftime('%H:%M:%S')}] Fetching real-time weather data...")
     try:
-        response = requests.get(BASE_API_URL, params=params, timeout=30)
+        response = _SESSION.get(BASE_API_URL, params=params, timeout=30)
         response.raise_for_status()
         print(f"✅ SUCCESS: API response received. Status: {response.status_code}")
-        return response.json()
+        return orjson.loads(response.content)
     except requests.exceptions.HTTPError as e:
         print(f"❌ HTTP ERROR: {e}")
     except Exception as e:
         print(f"❌ UNEXPECTED ERROR during fetch: {e}")
     return None
 
-def read_csv_with_lock(filepath):
-    """Read CSV file with file locking."""
-    with open(filepath, 'r') as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-        try:
-            df = pd.read_csv(f)
-            return df
-        finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-
-def write_csv_with_lock(df, filepath, mode='w'):
-    """Write CSV file with file locking."""
-    with open(filepath, mode) as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+def update_last_row_with_lock(filepath, updates):
+    """Overwrite columns of the last CSV row, rewriting only that line in place.
+    
+    Returns the updated row as a dict, or None if the file has no data rows.
+    """
+    fd = os.open(filepath, os.O_RDWR)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
         try:
-            if mode == 'w':
-                df.to_csv(f, index=False)
+            offset, last_line = find_last_line(fd)
+            if not offset:
+                return None
+            
+            head = os.pread(fd, min(offset, 65536), 0)
+            header = next(csv.reader([head.split(b'\n', 1)[0].decode('utf-8')]))
+            
+            missing = [column for column in updates if column not in header]
+            if missing:
+                # A weather column the file does not have yet (e.g. a file
+                # freshly created by the live pipeline): widen it once,
+                # rewriting the whole file through the locked descriptor
+                rows = list(csv.reader(io.StringIO(os.pread(fd, os.fstat(fd).st_size, 0).decode('utf-8'))))
+                header = rows[0] + missing
+                rows[0] = header
+                start, new_content = 0, rows
             else:
-                df.to_csv(f, index=False, header=False)
+                start, new_content = offset, [next(csv.reader([last_line]))]
+            
+            row = new_content[-1]
+            row += [''] * (len(header) - len(row))
+            for column, value in updates.items():
+                row[header.index(column)] = '' if value is None else value
+            
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator='\n').writerows(new_content)
+            data = buf.getvalue().encode('utf-8')
+            os.pwrite(fd, data, start)
+            os.ftruncate(fd, start + len(data))
+            return dict(zip(header, row))
         finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
 
 def round_to_nearest_10min(dt):
     """Round datetime to nearest 10-minute interval."""
@@ -123,25 +175,39 @@ def round_to_nearest_10min(dt):
     minutes = (dt.minute // 10) * 10
     return dt.replace(minute=minutes, second=0, microsecond=0)
 
+def find_last_line(fd, chunk_size=4096):
+    """Return (offset, text) of the last non-empty line of a file, reading backwards from the end."""
+    pos = os.fstat(fd).st_size
+    tail = b''
+    while pos > 0:
+        read_size = min(chunk_size, pos)
+        pos -= read_size
+        tail = os.pread(fd, read_size, pos) + tail
+        stripped = tail.rstrip()
+        newline = stripped.rfind(b'\n')
+        if newline != -1:
+            return pos + newline + 1, stripped[newline + 1:].decode('utf-8')
+    stripped = tail.rstrip()
+    return (0, stripped.decode('utf-8')) if stripped else (None, None)
+
 def save_all_stations_data(all_stations_data, obs_datetime):
     """Save comprehensive weather data for all stations in wide format."""
-    all_stations_file = STRU_DATA_DIR / "all_stations_weather.csv"
-    
-    # Prepare data dictionary with DateTime as first column
-    row_data = {"DateTime": obs_datetime}
+    # The last saved DateTime lives in a one-line sidecar, so repeats are
+    # caught without reading the wide CSV
+    if ALL_STATIONS_LASTTS_FILE.exists() and ALL_STATIONS_LASTTS_FILE.read_text(encoding='utf-8').strip() == obs_datetime:
+        print(f"⚠️ Data for {obs_datetime} already exists in all_stations_weather.csv. Skipping.")
+        return
     
-    # Process each station
+    # One value list per station, in ALL_STATION_FIELDS order
+    station_values = {}
     for station in all_stations_data:
         station_name = station.get("StationName")
         if not station_name:
             continue
             
         elements = station.get("WeatherElement", {})
-        
-        # Extract all fields for this station
+        values = []
         for field in ALL_STATION_FIELDS:
-            column_name = f"{station_name}_{field}"
-            
             if field == "Precipitation":
                 # Special handling for precipitation (nested in "Now")
                 value = elements.get("Now", {}).get("Precipitation")
@@ -150,32 +216,89 @@ def save_all_stations_data(all_stations_data, obs_datetime):
             
             # Convert to float, handling null values
             float_value = safe_float_convert(value)
-            row_data[column_name] = float_value if float_value is not None else ""
-    
-    # Create DataFrame with single row
-    new_df = pd.DataFrame([row_data])
+            values.append(float_value if float_value is not None else "")
+        station_values[station_name] = values
     
     # Check if file exists and append or create new
-    if all_stations_file.exists():
+    if ALL_STATIONS_FILE.exists():
         try:
-            # Read existing data
-            existing_df = read_csv_with_lock(all_stations_file)
-            
-            # Check if this timestamp already exists
-            if obs_datetime in existing_df['DateTime'].values:
-                print(f"⚠️ Data for {obs_datetime} already exists in all_stations_weather.csv. Skipping.")
-                return
-            
-            # Append new row
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-            write_csv_with_lock(combined_df, all_stations_file)
+            with open(ALL_STATIONS_FILE, 'r+', encoding='utf-8', newline='') as f:
+                fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    header = next(csv.reader([f.readline()]))
+                    
+                    # Without a sidecar yet, fall back to the file's last row once
+                    if not ALL_STATIONS_LASTTS_FILE.exists():
+                        _, last_line = find_last_line(f.fileno())
+                        if last_line and next(csv.reader([last_line]))[0] == obs_datetime:
+                            print(f"⚠️ Data for {obs_datetime} already exists in all_stations_weather.csv. Skipping.")
+                            write_lastts(obs_datetime)
+                            return
+                    
+                    known_stations = {column.rsplit('_', 1)[0] for column in header[1:]}
+                    new_columns = [
+                        f"{station_name}_{field}"
+                        for station_name in station_values if station_name not in known_stations
+                        for field in ALL_STATION_FIELDS
+                    ]
+                    if new_columns:
+                        # A station we have not seen before: widen the file once,
+                        # leaving earlier rows empty in the new columns. The
+                        # rewrite goes through the locked handle rather than a
+                        # replaced file, so a writer waiting on the lock still
+                        # ends up appending to the live file
+                        header = header + new_columns
+                        padding = [""] * len(new_columns)
+                        rows = [old_row + padding for old_row in csv.reader(f)]
+                        f.seek(0)
+                        writer = csv.writer(f, lineterminator='\n')
+                        writer.writerow(header)
+                        writer.writerows(rows)
+                        writer.writerow(build_station_row(header, obs_datetime, station_values))
+                        f.truncate()
+                    else:
+                        # Append new row in the file's column order
+                        f.seek(0, os.SEEK_END)
+                        csv.writer(f, lineterminator='\n').writerow(build_station_row(header, obs_datetime, station_values))
+                finally:
+                    fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+            write_lastts(obs_datetime)
             print(f"✅ Appended new data to all_stations_weather.csv")
         except Exception as e:
             print(f"❌ Error updating all_stations_weather.csv: {e}")
     else:
-        # Create new file
-        write_csv_with_lock(new_df, all_stations_file)
-        print(f"✅ Created new all_stations_weather.csv with {len(row_data)-1} station metrics")
+        # Create new file: DateTime, then each station's fields in API order
+        header = ["DateTime"] + [
+            f"{station_name}_{field}" for station_name in station_values for field in ALL_STATION_FIELDS
+        ]
+        row = [obs_datetime]
+        for values in station_values.values():
+            row.extend(values)
+        with open(ALL_STATIONS_FILE, 'w', encoding='utf-8', newline='') as f:
+            fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
+            try:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(header)
+                writer.writerow(row)
+            finally:
+                fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+        write_lastts(obs_datetime)
+        print(f"✅ Created new all_stations_weather.csv with {len(row)-1} station metrics")
+
+def build_station_row(header, obs_datetime, station_values):
+    """Lay station values out as a list in the header's column order."""
+    row = [obs_datetime]
+    for column in header[1:]:
+        station_name, field = column.rsplit('_', 1)
+        values = station_values.get(station_name)
+        row.append(values[_STATION_FIELD_POS[field]] if values else "")
+    return row
+
+def write_lastts(obs_datetime):
+    """Atomically record the last DateTime saved to all_stations_weather.csv."""
+    tmp_path = ALL_STATIONS_LASTTS_FILE.with_suffix('.lastts.tmp')
+    tmp_path.write_text(obs_datetime, encoding='utf-8')
+    os.replace(tmp_path, ALL_STATIONS_LASTTS_FILE)
 
 def get_latest_timestamp_from_csvs():
     """Get the most recent timestamp from regional CSV files."""
@@ -186,12 +309,24 @@ def get_latest_timestamp_from_csvs():
             continue
             
         try:
-            df = pd.read_csv(region_file)
-            if not df.empty and 'Timestamp' in df.columns:
-                df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-                file_latest = df['Timestamp'].max()
-                if latest_timestamp is None or file_latest > latest_timestamp:
-                    latest_timestamp = file_latest
+            st = region_file.stat()
+            cached = _latest_ts_cache.get(region_file)
+            if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+                file_latest = cached[2]
+            else:
+                # Rows are appended in time order, so the last line holds the
+                # latest timestamp; read the header and tail instead of the file
+                file_latest = None
+                with open(region_file, 'rb') as f:
+                    header = f.readline().decode('utf-8').strip()
+                    if header.split(',', 1)[0] == 'Timestamp':
+                        _, last_line = find_last_line(f.fileno())
+                        if last_line and last_line != header:
+                            file_latest = datetime.fromisoformat(last_line.split(',', 1)[0])
+                _latest_ts_cache[region_file] = (st.st_mtime_ns, st.st_size, file_latest)
+            
+            if file_latest is not None and (latest_timestamp is None or file_latest > latest_timestamp):
+                latest_timestamp = file_latest
         except Exception as e:
             print(f"⚠️ Could not read {region_file.name}: {e}")
     
@@ -241,7 +376,7 @@ def process_and_update_data(api_data):
 
     for station in all_stations_data:
         station_name = station.get("StationName")
-        if not any(station_name in sl for sl in STATIONS_BY_REGION.values()):
+        if station_name not in _STATION_TO_REGION:
             continue
 
         obs_time_str = station.get("ObsTime", {}).get("DateTime")
@@ -271,34 +406,53 @@ def process_and_update_data(api_data):
             "ObsTime": obs_time_str
         }
 
-        log_rows.append({
-            "Timestamp": obs_time_str,
-            "StationName": station_name,
-            "AirTemperature": temp if temp is not None else 'NULL',
-            "WindSpeed": wind if wind is not None else 'NULL',
-            "SunshineDuration": sunshine if sunshine is not None else 'NULL',
-            "Precipitation": precip if precip is not None else 'NULL',
-            "HasNullValue": has_null
-        })
+        # Row in WEATHER_LOG_FIELDS order
+        log_rows.append([
+            obs_time_str,
+            station_name,
+            temp if temp is not None else 'NULL',
+            wind if wind is not None else 'NULL',
+            sunshine if sunshine is not None else 'NULL',
+            precip if precip is not None else 'NULL',
+            has_null
+        ])
 
     if not log_rows:
         print("⚠️ No relevant stations found in the fetched data.")
         return
 
-    # Log individual station data
-    log_file_exists = WEATHER_LOG_FILE.exists()
+    # Log individual station data: serialize everything first, then one locked write
     with open(WEATHER_LOG_FILE, 'a', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ["Timestamp", "StationName", "AirTemperature", "WindSpeed", "SunshineDuration", "Precipitation", "HasNullValue"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not log_file_exists:
-            writer.writeheader()
-        writer.writerows(log_rows)
+        fcntl.lockf(csvfile.fileno(), fcntl.LOCK_EX)
+        try:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            if csvfile.tell() == 0:
+                writer.writerow(WEATHER_LOG_FIELDS)
+            writer.writerows(log_rows)
+            csvfile.write(buf.getvalue())
+        finally:
+            fcntl.lockf(csvfile.fileno(), fcntl.LOCK_UN)
     print(f"📝 {len(log_rows)} station records logged")
 
+    # Station x field matrix of the averaged fields, NaN where a value is missing
+    # Row numbers of each region's stations, bucketed in one pass
+    station_index = {}
+    region_rows = {region: [] for region in STATIONS_BY_REGION}
+    for i, name in enumerate(processed_stations):
+        station_index[name] = i
+        region_rows[_STATION_TO_REGION[name]].append(i)
+    values = np.array(
+        [[np.nan if station[field] is None else station[field] for field in TARGET_FIELDS]
+         for station in processed_stations.values()],
+        dtype=float
+    ).reshape(-1, len(TARGET_FIELDS))
+
     # Update regional CSV files with weather data
-    print("\n" + "="*60)
-    print("STARTING REGIONAL PROCESSING WITH DEBUG OUTPUT")
-    print("="*60)
+    if DEBUG_REGIONAL:
+        print("\n" + "="*60)
+        print("STARTING REGIONAL PROCESSING WITH DEBUG OUTPUT")
+        print("="*60)
     
     for region, station_list in STATIONS_BY_REGION.items():
         csv_path = STRU_DATA_DIR / f"{region}.csv"
@@ -307,75 +461,48 @@ def process_and_update_data(api_data):
         if region == "Other":
             continue
         
-        # Calculate regional averages
-        regional_averages = {}
-        print(f"\n🔍 DEBUG: Processing {region} region")
-        print(f"   Stations in region: {station_list}")
-        sys.stdout.flush()
+        # Calculate all regional averages in one vectorized pass
+        region_values = values[region_rows[region]]
+        valid_counts = np.count_nonzero(~np.isnan(region_values), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages = np.nansum(region_values, axis=0) / valid_counts
+        regional_averages = {
+            field: round(float(average), 2) if count else None
+            for field, average, count in zip(TARGET_FIELDS, averages, valid_counts)
+        }
         
-        for field in TARGET_FIELDS:
-            print(f"\n   📊 Field: {field}")
-            
-            # Collect values with detailed logging
-            station_values = []
-            for s_name in station_list:
-                if s_name in processed_stations:
-                    value = processed_stations[s_name][field]
-                    obs_time = processed_stations[s_name]['ObsTime']
-                    station_values.append((s_name, value))
-                    print(f"      - {s_name}: {value if value is not None else 'NULL'} (ObsTime: {obs_time})")
-                else:
-                    print(f"      - {s_name}: NOT FOUND in processed stations")
-            
-            # Filter out None values for average calculation
-            valid_values = [v for name, v in station_values if v is not None]
-            
-            if valid_values:
-                average = sum(valid_values) / len(valid_values)
-                regional_averages[field] = round(average, 2)
-                print(f"      ➡️  Average ({len(valid_values)} valid stations): {regional_averages[field]}")
-            else:
-                regional_averages[field] = None
-                print(f"      ➡️  Average: None (no valid data)")
+        if DEBUG_REGIONAL:
+            print(f"\n🔍 DEBUG: Processing {region} region")
+            print(f"   Stations in region: {station_list}")
+            for field_pos, field in enumerate(TARGET_FIELDS):
+                print(f"\n   📊 Field: {field}")
+                for s_name in station_list:
+                    if s_name in station_index:
+                        value = values[station_index[s_name], field_pos]
+                        obs_time = processed_stations[s_name]['ObsTime']
+                        print(f"      - {s_name}: {value if not np.isnan(value) else 'NULL'} (ObsTime: {obs_time})")
+                    else:
+                        print(f"      - {s_name}: NOT FOUND in processed stations")
+                print(f"      ➡️  Average ({valid_counts[field_pos]} valid stations): {regional_averages[field]}")
 
-        # Update CSV file
+        # Update the weather columns of the most recent row (last row) instead
+        # of an exact timestamp match; only that line of the file is rewritten
         if csv_path.exists():
             try:
-                df = read_csv_with_lock(csv_path)
+                last_row = update_last_row_with_lock(csv_path, regional_averages)
                 
-                # Debug East region specifically
-                if region == 'East':
-                    print(f"   -> East.csv debug: {len(df)} rows, columns: {list(df.columns)}")
-                    if not df.empty:
-                        print(f"   -> East last row Total_Generation: {df.iloc[-1].get('Total_Generation', 'N/A')}")
-                
-                if df.empty:
+                if last_row is None:
                     print(f"⚠️ {region}.csv is empty. Skipping weather update.")
                     continue
                 
-                # Convert timestamps to datetime for comparison
-                df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-                target_timestamp_dt = pd.to_datetime(target_timestamp)
-                
-                # Find the most recent row (last row) instead of exact timestamp match
-                # This is more flexible and handles timezone/format differences
-                last_idx = df.index[-1]  # Get last row
-                
-                # Update weather columns in the last row
-                df.loc[last_idx, 'AirTemperature'] = regional_averages.get('AirTemperature')
-                df.loc[last_idx, 'WindSpeed'] = regional_averages.get('WindSpeed') 
-                df.loc[last_idx, 'SunshineDuration'] = regional_averages.get('SunshineDuration')
-                df.loc[last_idx, 'Precipitation'] = regional_averages.get('Precipitation')
-                
-                # Debug output showing what values are being written
-                print(f"\n   💾 Writing to CSV for {region}:")
-                print(f"      - AirTemperature: {regional_averages.get('AirTemperature')}")
-                print(f"      - WindSpeed: {regional_averages.get('WindSpeed')}")
-                print(f"      - SunshineDuration: {regional_averages.get('SunshineDuration')}")
-                print(f"      - Precipitation: {regional_averages.get('Precipitation')}")
+                # Debug East region specifically
+                if DEBUG_REGIONAL and region == 'East':
+                    print(f"   -> East.csv debug: columns: {list(last_row)}")
+                    print(f"   -> East last row Total_Generation: {last_row.get('Total_Generation', 'N/A')}")
                 
-                write_csv_with_lock(df, csv_path)
-                print(f"✅ Updated weather data for {region} (last entry: {df.loc[last_idx, 'Timestamp']})")
+                # One summary line per region
+                summary = ", ".join(f"{field}={regional_averages[field]}" for field in TARGET_FIELDS)
+                print(f"✅ Updated weather data for {region} (last entry: {last_row['Timestamp']}): {summary}")
                     
             except Exception as e:
                 print(f"❌ ERROR updating {region}: {e}")
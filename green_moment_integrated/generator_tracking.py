@@ -8,11 +8,13 @@
 #   - Outputs a single CSV with all generators
 # ==============================================================================
 
-import pandas as pd
 from pathlib import Path
-import sys, re, json, requests, pytz, time, fcntl
+import sys, os, re, csv, json, requests, pytz, time, fcntl
+import ijson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
-import numpy as np
+from functools import lru_cache
 
 # --- Configuration ---
 BASE_DIR = Path(__file__).parent
@@ -21,21 +23,41 @@ LOGS_DIR = BASE_DIR / "logs"
 
 # Main output file
 GENERATORS_FILE = DATA_DIR / "all_generators.csv"
+# Last timestamp written to GENERATORS_FILE, so repeat ticks are skipped
+# without reading the file. The column order always comes from the CSV header
+COLUMNS_FILE = DATA_DIR / "all_generators.columns.json"
 LOG_FILE = LOGS_DIR / "generator_tracking.log"
+# Every generator seen historically; seeds the columns so units that come
+# back after an outage do not force another widening rewrite
+KNOWN_GENERATORS_FILE = BASE_DIR / "config" / "known_generators.json"
 
 TAIWAN_TZ = pytz.timezone('Asia/Taipei')
 DATA_URL = "https://www.taipower.com.tw/d006/loadGraph/loadGraph/data/genary.json"
 
+# Session for Taipower requests; retries 502/503/504 with backoff
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+# Compiled once; these run for every generator on every tick
+_BOLD_RE = re.compile(r'<b>(.*?)</b>')
+_PARENS_RE = re.compile(r'\(.*\)')
+_SANITIZE_RE = re.compile(r'[\\/*?:"<>|]')
+
 # --- Helper Functions ---
 def ensure_directories():
     """Create necessary directories if they don't exist."""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
+@lru_cache(maxsize=4096)
 def sanitize_name(name):
     """Remove content within parentheses and sanitize invalid characters."""
-    name_without_parentheses = re.sub(r'\(.*\)', '', name)
-    return re.sub(r'[\\/*?:"<>|]', '_', name_without_parentheses).strip()
+    name_without_parentheses = _PARENS_RE.sub('', name)
+    return _SANITIZE_RE.sub('_', name_without_parentheses).strip()
 
 def log_message(message):
     """Log message with timestamp."""
@@ -44,28 +66,128 @@ def log_message(message):
         f.write(f"[{timestamp}] {message}\n")
     print(f"   {message}")
 
-def read_csv_with_lock(filepath):
-    """Read CSV file with file locking."""
-    with open(filepath, 'r') as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+def read_last_timestamp():
+    """Return the last timestamp written to the generator CSV.
+    
+    If the manifest is missing, it is rebuilt from the CSV's last line.
+    """
+    if COLUMNS_FILE.exists():
+        with open(COLUMNS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)['last_timestamp']
+    
+    with open(GENERATORS_FILE, 'r', encoding='utf-8', newline='') as f:
+        fcntl.lockf(f.fileno(), fcntl.LOCK_SH)
         try:
-            df = pd.read_csv(f)
-            return df
+            f.readline()  # header
+            last_line = None
+            for last_line in f:
+                pass
         finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+    
+    last_timestamp = next(csv.reader([last_line]))[0] if last_line else None
+    write_last_timestamp(last_timestamp)
+    return last_timestamp
 
-def write_csv_with_lock(df, filepath, mode='w'):
-    """Write CSV file with file locking."""
-    with open(filepath, mode) as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-        try:
-            if mode == 'w':
-                df.to_csv(f, index=False)
-            else:
-                df.to_csv(f, index=False, header=False)
-        finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+def write_last_timestamp(last_timestamp):
+    """Atomically replace the manifest."""
+    tmp_path = COLUMNS_FILE.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'last_timestamp': last_timestamp}, f, ensure_ascii=False)
+    os.replace(tmp_path, COLUMNS_FILE)
+
+def load_known_generators():
+    """Return the set of generators seen historically."""
+    if not KNOWN_GENERATORS_FILE.exists():
+        return set()
+    with open(KNOWN_GENERATORS_FILE, 'r', encoding='utf-8') as f:
+        return set(json.load(f))
+
+def save_known_generators(generators):
+    """Atomically replace the known generator list."""
+    tmp_path = KNOWN_GENERATORS_FILE.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(generators), f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, KNOWN_GENERATORS_FILE)
+
+def is_current_file(f, filepath):
+    """Return True if the open file f is still the file at filepath.
+    
+    write_row_with_lock and rollup_generators.py swap in a new file with
+    os.replace while holding the lock, so a caller that was waiting on the
+    lock may end up holding the replaced, unlinked file.
+    """
+    return os.fstat(f.fileno()).st_ino == os.stat(filepath).st_ino
+
+def write_row_with_lock(current_generators, timestamp_str, total_generation):
+    """Append one tick's row to the generator CSV, widening it first if needed.
+    
+    The existing columns are read from the CSV header under the lock, so
+    the row always matches the layout the file actually has.
+    Returns the column order that was written.
+    """
+    while True:
+        with open(GENERATORS_FILE, 'r+', encoding='utf-8', newline='') as f:  # writable: lockf needs it for LOCK_EX
+            fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if not is_current_file(f, GENERATORS_FILE):
+                    continue  # Replaced while waiting for the lock; reopen
+                header = next(csv.reader([f.readline()]))
+                existing_generators = [col for col in header if col not in ('Timestamp', 'Total_Generation')]
+                
+                # Any new generators
+                new_generators = set(current_generators) - set(existing_generators)
+                
+                # Check for removed generators
+                inactive_generators = [gen for gen in existing_generators if gen not in current_generators]
+                if inactive_generators:
+                    log_message(f"Generators not reporting ({len(inactive_generators)}): {', '.join(sorted(inactive_generators)[:5])}...")
+                
+                if new_generators:
+                    log_message(f"Found {len(new_generators)} new generators: {', '.join(sorted(new_generators))}")
+                    # Widen with every known generator at once, not just today's new ones
+                    known_generators = load_known_generators()
+                    generators = sorted(set(existing_generators) | new_generators | known_generators)
+                    if not known_generators.issuperset(new_generators):
+                        save_known_generators(known_generators | new_generators)
+                else:
+                    generators = existing_generators
+                
+                # Existing generators get 0 if not currently active
+                row = [timestamp_str] + [current_generators.get(g, 0.0) for g in generators] + [total_generation]
+                
+                if new_generators:
+                    # New columns: stream the history into a widened copy
+                    rewrite_with_new_columns(f, header, generators, row)
+                else:
+                    # No new columns, just append the new row
+                    f.seek(0, os.SEEK_END)
+                    csv.writer(f, lineterminator='\n').writerow(row)
+                return generators
+            finally:
+                fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
 
+def rewrite_with_new_columns(src, header, generators, row):
+    """Stream the locked CSV into a copy with new zero-filled columns, then append row.
+    
+    src must be positioned just after the header line.
+    """
+    old_index = {name: i for i, name in enumerate(header)}
+    total_index = old_index['Total_Generation']
+    tmp_path = GENERATORS_FILE.with_suffix('.tmp')
+    
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+        writer = csv.writer(dst, lineterminator='\n')
+        writer.writerow(['Timestamp'] + generators + ['Total_Generation'])
+        for old_row in csv.reader(src):
+            writer.writerow(
+                [old_row[0]]
+                + [old_row[old_index[g]] if g in old_index else '0.0' for g in generators]
+                + [old_row[total_index]]
+            )
+        writer.writerow(row)
+    os.replace(tmp_path, GENERATORS_FILE)
 
 def fetch_generation_data():
     """Fetch power generation data from Taipower API."""
@@ -74,41 +196,41 @@ def fetch_generation_data():
     full_url = f"{DATA_URL}?_={timestamp_suffix}"
     
     try:
-        resp = requests.get(full_url, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        # Stream aaData rows straight off the socket instead of loading the
+        # whole payload first
+        generators = {}
+        row_count = 0
+        with _SESSION.get(full_url, stream=True, timeout=30) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            
+            for row in ijson.items(resp.raw, 'aaData.item', use_float=True):
+                row_count += 1
+                if len(row) < 5 or '小計' in row[2]:
+                    continue
+                    
+                unit_name = row[2].strip()
+                net_p_str = str(row[4]).replace(',', '')
+                
+                # Extract fuel type from HTML (for logging purposes)
+                match = _BOLD_RE.search(row[0])
+                if not match or not unit_name or 'Load' in match.group(1):
+                    continue
+                
+                # Parse power value
+                try:
+                    net_p = float(net_p_str)
+                except ValueError:
+                    net_p = 0.0
+                
+                # Use sanitized name as key
+                generator_key = sanitize_name(unit_name)
+                generators[generator_key] = net_p
         
-        # Get the data array
-        live_data = data.get('aaData', [])
-        if not live_data:
+        if not row_count:
             log_message("ERROR: No aaData found in API response")
             return None, None
         
-        # Process the raw data
-        generators = {}
-        
-        for row in live_data:
-            if len(row) < 5 or '小計' in row[2]:
-                continue
-                
-            unit_name = row[2].strip()
-            net_p_str = str(row[4]).replace(',', '')
-            
-            # Extract fuel type from HTML (for logging purposes)
-            match = re.search(r'<b>(.*?)</b>', row[0])
-            if not match or not unit_name or 'Load' in match.group(1):
-                continue
-            
-            # Parse power value
-            try:
-                net_p = float(net_p_str) if re.match(r'^-?\d+(\.\d+)?$', net_p_str) else 0.0
-            except:
-                net_p = 0.0
-            
-            # Use sanitized name as key
-            generator_key = sanitize_name(unit_name)
-            generators[generator_key] = net_p
-        
         if not generators:
             log_message("ERROR: No valid generator records found")
             return None, None
@@ -127,95 +249,41 @@ def fetch_generation_data():
         return None, None
 
 def update_generator_data(current_generators, timestamp):
-    """Update the generator CSV file with new data."""
-    # Prepare row data for the new timestamp
-    row_data = {'Timestamp': timestamp}
+    """Append the new data to the generator CSV file."""
+    total_generation = sum(current_generators.values())
+    timestamp_str = str(timestamp)
     
-    # Update or create CSV file
-    if GENERATORS_FILE.exists():
-        try:
-            # Read existing data
-            existing_df = read_csv_with_lock(GENERATORS_FILE)
-            existing_df['Timestamp'] = pd.to_datetime(existing_df['Timestamp'])
-            
-            # Check if this timestamp already exists
-            if pd.Timestamp(timestamp) in existing_df['Timestamp'].values:
-                log_message(f"Timestamp {timestamp} already exists, skipping update")
-                return
-            
-            # Get all existing generator columns (excluding Timestamp and Total_Generation)
-            existing_generators = [col for col in existing_df.columns if col not in ['Timestamp', 'Total_Generation']]
-            
-            # Add existing generators to row_data (0 if not currently active)
-            for generator in existing_generators:
-                row_data[generator] = current_generators.get(generator, 0.0)
-            
-            # Add any new generators
-            new_generators = set(current_generators.keys()) - set(existing_generators)
-            if new_generators:
-                log_message(f"Found {len(new_generators)} new generators: {', '.join(sorted(new_generators))}")
-                # Add new generators to existing dataframe with 0 for all previous rows
-                for new_gen in new_generators:
-                    existing_df[new_gen] = 0.0
-                    row_data[new_gen] = current_generators[new_gen]
-            
-            # Check for removed generators
-            inactive_generators = [gen for gen in existing_generators if gen not in current_generators]
-            if inactive_generators:
-                log_message(f"Generators not reporting ({len(inactive_generators)}): {', '.join(sorted(inactive_generators)[:5])}...")
-            
-            # Add total generation column
-            row_data['Total_Generation'] = sum(current_generators.values())
-            
-            # Create new row dataframe with all columns
-            all_columns = ['Timestamp'] + sorted([col for col in existing_df.columns if col not in ['Timestamp', 'Total_Generation']]) + ['Total_Generation']
-            new_row_df = pd.DataFrame([row_data])
-            
-            # Ensure all columns exist in new row
-            for col in all_columns:
-                if col not in new_row_df.columns:
-                    new_row_df[col] = 0.0
-            
-            # Reorder columns to match
-            new_row_df = new_row_df[all_columns]
-            
-            # If we added new columns, we need to rewrite the entire file
-            if new_generators:
-                # Append the new row to existing dataframe
-                existing_df = pd.concat([existing_df, new_row_df], ignore_index=True)
-                # Write the entire dataframe
-                write_csv_with_lock(existing_df, GENERATORS_FILE)
-            else:
-                # No new columns, just append the new row
-                write_csv_with_lock(new_row_df, GENERATORS_FILE, mode='a')
-            
-            log_message(f"Appended data: {len(current_generators)} active generators, {len(all_columns)-2} total columns")
-            
-        except Exception as e:
-            log_message(f"ERROR updating existing file: {e}")
-            # If error, try to continue by creating row with current generators
-            for gen, value in current_generators.items():
-                row_data[gen] = value
-            row_data['Total_Generation'] = sum(current_generators.values())
-            new_df = pd.DataFrame([row_data])
-            # Reorder columns: Timestamp, sorted generators, Total_Generation
-            cols = ['Timestamp'] + sorted([c for c in new_df.columns if c not in ['Timestamp', 'Total_Generation']]) + ['Total_Generation']
-            new_df = new_df[cols]
-            write_csv_with_lock(new_df, GENERATORS_FILE)
-            log_message("Created new generator tracking file")
-    else:
-        # Create new file with current generators
-        for gen, value in current_generators.items():
-            row_data[gen] = value
-        row_data['Total_Generation'] = sum(current_generators.values())
+    if not GENERATORS_FILE.exists():
+        # Create new file with current and known generators: Timestamp, sorted generators, Total_Generation
+        known_generators = load_known_generators()
+        generators = sorted(known_generators | set(current_generators))
+        with open(GENERATORS_FILE, 'w', encoding='utf-8', newline='') as f:
+            fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
+            try:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(['Timestamp'] + generators + ['Total_Generation'])
+                writer.writerow([timestamp_str] + [current_generators.get(g, 0.0) for g in generators] + [total_generation])
+            finally:
+                fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+        write_last_timestamp(timestamp_str)
+        if not known_generators.issuperset(generators):
+            save_known_generators(generators)
+        log_message(f"Created new generator tracking file with {len(current_generators)} generators")
+        return
+    
+    try:
+        # Rows are appended in time order, so a repeat can only be the last one
+        if read_last_timestamp() == timestamp_str:
+            log_message(f"Timestamp {timestamp} already exists, skipping update")
+            return
         
-        new_df = pd.DataFrame([row_data])
-        # Reorder columns: Timestamp, sorted generators, Total_Generation
-        cols = ['Timestamp'] + sorted([c for c in new_df.columns if c not in ['Timestamp', 'Total_Generation']]) + ['Total_Generation']
-        new_df = new_df[cols]
+        generators = write_row_with_lock(current_generators, timestamp_str, total_generation)
+        write_last_timestamp(timestamp_str)
         
-        write_csv_with_lock(new_df, GENERATORS_FILE)
-        log_message(f"Created new generator tracking file with {len(current_generators)} generators")
+        log_message(f"Appended data: {len(current_generators)} active generators, {len(generators)} total columns")
+        
+    except Exception as e:
+        log_message(f"ERROR updating existing file: {e}")
 
 def main():
     """Main execution function."""
@@ -4,11 +4,18 @@
 #   - A separate version for testing with a specific plant-to-region map.
 #   - Data is stored in the 'tampered_data' directory.
 # ==============================================================================
+import asyncio
 import pandas as pd
 from pathlib import Path
-import sys, re, json, requests, pytz, time, fcntl
+import sys, os, io, re, csv, requests, fcntl
+import orjson
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- Configuration ---
 BASE_DIR = Path(__file__).parent
@@ -24,10 +31,22 @@ LOG_FILE = LOGS_DIR / "fluctuation_log_tampered.txt"
 # --- END MODIFIED LINES ---
 DEMAND_FILE = STRU_DATA_DIR / "electricity_demand.csv"
 
-TAIWAN_TZ = pytz.timezone('Asia/Taipei')
+TAIWAN_TZ = ZoneInfo('Asia/Taipei')
 DATA_URL = "https://www.taipower.com.tw/d006/loadGraph/loadGraph/data/genary.json"
 DEMAND_URL = "https://www.taipower.com.tw/d006/loadGraph/loadGraph/data/loadpara.json"
 
+# Set GREEN_DEBUG=1 to print fuel, region and per-region fuel breakdowns
+DEBUG_REGIONAL = os.getenv("GREEN_DEBUG") == "1"
+
+# Both endpoints are on taipower.com.tw, so the demand request reuses the
+# connection opened for the generation request
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+))
+
 # (The rest of the script is identical to the one you provided and is correct)
 # Fuel type mapping from Chinese to English
 FUEL_TYPE_MAP = {
@@ -49,6 +68,32 @@ FUEL_TYPE_MAP = {
 # All fuel types for CSV columns
 ALL_FUEL_TYPES = list(FUEL_TYPE_MAP.values())
 
+# Columns of a regional CSV as written by this script
+REGIONAL_COLUMNS = ['Timestamp'] + ALL_FUEL_TYPES + ['Total_Generation', 'AirTemperature', 'WindSpeed', 'SunshineDuration']
+
+# Keywords used to infer the region of units missing from the plant map
+REGION_KEYWORDS = {
+    'North': ['林口', '大潭', '新桃', '通霄', '協和', '石門', '翡翠', '桂山', '觀音', '龍潭', '北部', '桃園', '國光', '海湖', '松山'],
+    'Central': ['台中', '大甲溪', '明潭', '彰工', '中港', '竹南', '苗栗', '雲林', '麥寮', '中部', '彰', '中能', '水里'],
+    'South': ['興達', '大林', '南部', '核三', '曾文', '嘉義', '台南', '高雄', '永安', '屏東'],
+    'East': ['和平', '花蓮', '蘭陽', '卑南', '立霧', '東部'],
+    'Islands': ['澎湖', '金門', '馬祖', '塔山', '離島'],
+    'Other': ['汽電共生', '其他台電自有', '其他購電太陽能', '其他購電風力', '購買地熱', '台電自有地熱', '生質能']
+}
+
+# One alternation per region: a single scan of the name per region
+# instead of one substring test per keyword
+_REGION_PATTERNS = [
+    (region, re.compile('|'.join(map(re.escape, keywords))))
+    for region, keywords in REGION_KEYWORDS.items()
+]
+
+# Patterns applied to every generator row, compiled once
+_PAREN_RE = re.compile(r'\(.*\)')
+_INVALID_RE = re.compile(r'[\\/*?:"<>|]')
+_BOLD_RE = re.compile(r'<b>(.*?)</b>')
+_NUM_RE = re.compile(r'-?\d+(\.\d+)?')
+
 # --- Helper Functions ---
 def ensure_directories():
     """Create necessary directories if they don't exist."""
@@ -56,102 +101,101 @@ def ensure_directories():
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
-def sanitize_name(name):
-    """Remove content within parentheses and sanitize invalid characters."""
-    name_without_parentheses = re.sub(r'\(.*\)', '', name)
-    return re.sub(r'[\\/*?:"<>|]', '_', name_without_parentheses).strip()
-
-def infer_region_from_name(unit_name):
-    """Infer region based on keywords in unit name."""
-    region_keywords = {
-        'North': ['林口', '大潭', '新桃', '通霄', '協和', '石門', '翡翠', '桂山', '觀音', '龍潭', '北部', '桃園', '國光', '協和', '海湖', '新桃', '松山'],
-        'Central': ['台中', '大甲溪', '明潭', '彰工', '中港', '竹南', '苗栗', '雲林', '麥寮', '中部', '彰', '中能', '水里'],
-        'South': ['興達', '大林', '南部', '核三', '曾文', '嘉義', '台南', '高雄', '永安', '屏東'],
-        'East': ['和平', '花蓮', '蘭陽', '卑南', '立霧', '東部'], 
-        'Islands': ['澎湖', '金門', '馬祖', '塔山', '離島'],
-        'Other': ['汽電共生', '其他台電自有', '其他購電太陽能', '其他購電風力', '購買地熱', '台電自有地熱', '生質能']
-    }
-    for region, keywords in region_keywords.items():
-        if any(kw in str(unit_name) for kw in keywords): 
-            return region
-    return None
+def sanitize_names(names):
+    """Remove content within parentheses and sanitize invalid characters in a Series of names."""
+    names_without_parentheses = names.str.replace(_PAREN_RE, '', regex=True)
+    return names_without_parentheses.str.replace(_INVALID_RE, '_', regex=True).str.strip()
+
+def infer_regions_from_names(unit_names):
+    """Infer regions for a Series of unit names from keywords; None where nothing matches."""
+    regions = pd.Series(None, index=unit_names.index, dtype=object)
+    names = unit_names.astype(str)
+    # Regions are tried in order, so a name matching several keeps the first
+    for region, pattern in _REGION_PATTERNS:
+        hits = regions.isna() & names.str.contains(pattern)
+        regions[hits] = region
+    return regions
+
+@lru_cache(maxsize=4)
+def _load_plant_mapping_cached(mtime_ns):
+    """Parse the plant map; keyed on its mtime so an edited file is re-read."""
+    df_map = pd.read_csv(PLANT_MAP_FILE)
+    df_map['REGION'] = df_map['REGION'].str.strip()
+    df_map['UNIT_NAME'] = df_map['UNIT_NAME'].str.strip()
+    return dict(zip(df_map['UNIT_NAME'], df_map['REGION']))
 
 def load_plant_mapping():
     """Load plant to region mapping from CSV file."""
-    if PLANT_MAP_FILE.exists():
-        try:
-            df_map = pd.read_csv(PLANT_MAP_FILE)
-            df_map['REGION'] = df_map['REGION'].str.strip()
-            df_map['UNIT_NAME'] = df_map['UNIT_NAME'].str.strip()
-            return dict(zip(df_map['UNIT_NAME'], df_map['REGION']))
-        except Exception as e:
-            print(f"❌ ERROR loading plant mapping: {e}")
+    try:
+        return _load_plant_mapping_cached(PLANT_MAP_FILE.stat().st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"❌ ERROR loading plant mapping: {e}")
     return {}
 
-def fetch_generation_data():
+def round_to_10min(dt):
+    """Round a datetime down to its 10-minute slot."""
+    return dt.replace(minute=(dt.minute // 10) * 10, second=0, microsecond=0)
+
+def fetch_generation_data(update_dt, cache_bust):
     """Fetch power generation data from Taipower API."""
     print(f"   📡 Fetching generation data...")
-    timestamp_suffix = int(time.time())
-    full_url = f"{DATA_URL}?_={timestamp_suffix}"
+    full_url = f"{DATA_URL}?_={cache_bust}"
     
     try:
-        resp = requests.get(full_url, timeout=30)
+        resp = _SESSION.get(full_url, timeout=30)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         
         live_data = data.get('aaData', [])
         if not live_data:
             print("❌ No aaData found in API response")
             return None, None
         
-        records = []
-        fuel_map = {
-            '太陽能': 'Solar', '風力': 'Wind', '燃煤': 'Coal', '燃氣': 'LNG', '水力': 'Hydro',
-            '核能': 'Nuclear', '汽電共生': 'Co-Gen', '民營電廠-燃煤': 'IPP-Coal', '民營電廠-燃氣': 'IPP-LNG',
-            '燃油': 'Oil', '輕油': 'Diesel', '其它再生能源': 'Other_Renewable', '儲能': 'Storage',
-            '太陽能(Solar)': 'Solar', '風力(Wind)': 'Wind', '燃煤(Coal)': 'Coal', '燃氣(LNG)': 'LNG',
-            '水力(Hydro)': 'Hydro', '核能(Nuclear)': 'Nuclear', '汽電共生(Co-Gen)': 'Co-Gen',
-            '民營電廠-燃煤(IPP-Coal)': 'IPP-Coal', '民營電廠-燃氣(IPP-LNG)': 'IPP-LNG', '燃油(Oil)': 'Oil',
-            '輕油(Diesel)': 'Diesel', '其它再生能源(Other Renewable Energy)': 'Other_Renewable',
-            '儲能(Energy Storage System)': 'Storage'
-        }
+        # Parse all rows column-wise; rows shorter than 5 fields are padded
+        # with None by the DataFrame constructor and dropped by the mask
+        raw = pd.DataFrame(live_data)
+        if raw.shape[1] < 5:
+            print("❌ No valid generator records found")
+            return None, None
         
-        for row in live_data:
-            if len(row) < 5 or '小計' in row[2]:
-                continue
-                
-            unit_name = row[2].strip()
-            net_p_str = str(row[4]).replace(',', '')
-            
-            match = re.search(r'<b>(.*?)</b>', row[0])
-            if not match or not unit_name or 'Load' in match.group(1):
-                continue
-                
-            fuel_type_zh = match.group(1)
-            fuel_type = fuel_map.get(fuel_type_zh, fuel_type_zh)
-            
-            net_p = float(net_p_str) if re.match(r'^-?\d+(\.\d+)?$', net_p_str) else None
-            
-            if net_p is not None:
-                records.append({
-                    'UNIT_NAME': sanitize_name(unit_name),
-                    'FUEL_TYPE': fuel_type,
-                    'FUEL_TYPE_ZH': fuel_type_zh,
-                    'NET_P': net_p
-                })
+        unit_names = raw[2].astype(str).str.strip()
+        fuel_type_zh = raw[0].astype(str).str.extract(_BOLD_RE, expand=False)
+        net_p_str = raw[4].astype(str).str.replace(',', '', regex=False)
         
-        if not records:
+        mask = (
+            raw[4].notna()
+            & ~unit_names.str.contains('小計', regex=False)
+            & (unit_names != '')
+            & fuel_type_zh.notna()
+            & ~fuel_type_zh.str.contains('Load', regex=False, na=True)
+            & net_p_str.str.fullmatch(_NUM_RE)
+        )
+        
+        if not mask.any():
             print("❌ No valid generator records found")
             return None, None
         
-        df = pd.DataFrame(records)
+        # Normalize labels like '太陽能' and '太陽能(Solar)' to the English
+        # fuel type once, so later steps only ever see ALL_FUEL_TYPES
+        fuel_type_zh = fuel_type_zh[mask]
+        fuel_type = fuel_type_zh.str.replace(_PAREN_RE, '', regex=True).str.strip().map(FUEL_TYPE_MAP)
+        unknown = fuel_type.isna()
+        if unknown.any():
+            print(f"   -> WARNING: Unknown fuel types kept as-is: {sorted(fuel_type_zh[unknown].unique())}")
+            fuel_type = fuel_type.fillna(fuel_type_zh)
         
-        print(f"   -> Fetched data for {len(records)} active power plant units.")
-        print(f"   -> Fuel types found: {df['FUEL_TYPE'].value_counts().to_dict()}")
+        df = pd.DataFrame({
+            'UNIT_NAME': sanitize_names(unit_names[mask]),
+            'FUEL_TYPE': fuel_type,
+            'FUEL_TYPE_ZH': fuel_type_zh,
+            'NET_P': net_p_str[mask].astype(float)
+        }).reset_index(drop=True)
         
-        current_time = datetime.now(TAIWAN_TZ)
-        effective_minute = (current_time.minute // 10) * 10
-        update_dt = current_time.replace(minute=effective_minute, second=0, microsecond=0)
+        print(f"   -> Fetched data for {len(df)} active power plant units.")
+        if DEBUG_REGIONAL:
+            print(f"   -> Fuel types found: {df['FUEL_TYPE'].value_counts().to_dict()}")
         
         df['DATETIME'] = update_dt
         return df, update_dt
@@ -160,16 +204,15 @@ def fetch_generation_data():
         print(f"❌ ERROR fetching generation data: {e}")
         return None, None
 
-def fetch_demand_data(timestamp):
+def fetch_demand_data(timestamp, cache_bust):
     """Fetch electricity demand data."""
     print(f"   📡 Fetching demand data...")
     try:
-        timestamp_suffix = int(time.time())
-        demand_url_with_bust = f"{DEMAND_URL}?_={timestamp_suffix}"
+        demand_url_with_bust = f"{DEMAND_URL}?_={cache_bust}"
         
-        resp = requests.get(demand_url_with_bust, timeout=20)
+        resp = _SESSION.get(demand_url_with_bust, timeout=20)
         resp.raise_for_status()
-        demand_data = resp.json()
+        demand_data = orjson.loads(resp.content)
         
         if not demand_data.get('records') or not isinstance(demand_data['records'], list) or not demand_data['records']:
             print("  -> WARNING: 'records' array not found or is empty in demand data. Skipping.")
@@ -191,23 +234,105 @@ def fetch_demand_data(timestamp):
     except Exception as e:
         print(f"  -> WARNING: Failed to fetch or process demand data: {e}")
 
-def read_csv_with_lock(filepath):
-    """Read CSV file with file locking."""
-    with open(filepath, 'r') as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+def append_row_with_lock(row, filepath):
+    """Append one CSV row with file locking."""
+    with open(filepath, 'a', encoding='utf-8', newline='') as f:
+        fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
         try:
-            return pd.read_csv(f)
+            csv.writer(f, lineterminator='\n').writerow(row)
         finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+
+def write_csv_atomic(header, rows, filepath):
+    """Write a whole CSV to a temp file and rename it over filepath.
+    
+    Readers see either the old file or the complete new one, never a
+    truncated file.
+    """
+    tmp_path = filepath.with_suffix('.csv.tmp')
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp_path, filepath)
+
+def find_last_line(fd, chunk_size=4096):
+    """Return (offset, text) of the last non-empty line of a file, reading backwards from the end."""
+    pos = os.fstat(fd).st_size
+    tail = b''
+    while pos > 0:
+        read_size = min(chunk_size, pos)
+        pos -= read_size
+        tail = os.pread(fd, read_size, pos) + tail
+        stripped = tail.rstrip()
+        newline = stripped.rfind(b'\n')
+        if newline != -1:
+            return pos + newline + 1, stripped[newline + 1:].decode('utf-8')
+    stripped = tail.rstrip()
+    return (0, stripped.decode('utf-8')) if stripped else (None, None)
 
-def write_csv_with_lock(df, filepath, mode='w'):
-    """Write CSV file with file locking."""
-    with open(filepath, mode) as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+def update_last_row_with_lock(csv_path, timestamp, updates):
+    """Overwrite columns of the last row in place if it is for `timestamp`.
+    
+    Returns False without writing if the file has no data rows or its
+    last row is for another slot.
+    """
+    fd = os.open(csv_path, os.O_RDWR)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
         try:
-            df.to_csv(f, index=False, header=(mode != 'a'))
+            offset, last_line = find_last_line(fd)
+            if not offset:
+                return False
+            row = next(csv.reader([last_line]))
+            # Timestamps are always written as str(timestamp), so one string
+            # compare is enough; no parsing needed
+            if row[0] != str(timestamp):
+                return False
+            
+            head = os.pread(fd, min(offset, 65536), 0)
+            header = next(csv.reader([head.split(b'\n', 1)[0].decode('utf-8')]))
+            row += [''] * (len(header) - len(row))
+            for column, value in updates.items():
+                row[header.index(column)] = value
+            
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator='\n').writerow(row)
+            data = buf.getvalue().encode('utf-8')
+            os.pwrite(fd, data, offset)
+            os.ftruncate(fd, offset + len(data))
+            return True
         finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def write_region_row(region, fuel_values, timestamp):
+    """Append (or update) one region's generation row and return a status line.
+    
+    fuel_values holds the ALL_FUEL_TYPES totals followed by Total_Generation.
+    """
+    csv_path = STRU_DATA_DIR / f"{region}.csv"
+    
+    # Weather columns stay empty; they are filled in separately
+    row = [timestamp] + fuel_values + [None, None, None]
+
+    if not csv_path.exists():
+        write_csv_atomic(REGIONAL_COLUMNS, [row], csv_path)
+        return f"   ✅ Created new file for {region}"
+
+    try:
+        # Rows are appended in time order, so a rerun for the same slot
+        # can only match the last row; rewrite just that line in place
+        # instead of reading and rewriting the whole history
+        updates = dict(zip(ALL_FUEL_TYPES + ['Total_Generation'], fuel_values))
+        if update_last_row_with_lock(csv_path, timestamp, updates):
+            return f"   ✅ Updated generation data for {region}"
+        append_row_with_lock(row, csv_path)
+        return f"   ✅ Appended generation data for {region}"
+    except Exception as e:
+        write_csv_atomic(REGIONAL_COLUMNS, [row], csv_path)
+        return f"   ❌ ERROR updating {region}: {e}\n   ✅ Created new file for {region} after error."
 
 def update_regional_data(df_generation, timestamp):
     """Update regional CSV files with generation data."""
@@ -216,86 +341,65 @@ def update_regional_data(df_generation, timestamp):
     df_generation['REGION'] = df_generation['UNIT_NAME'].map(plant_map)
     
     unmapped_mask = df_generation['REGION'].isna()
-    df_generation.loc[unmapped_mask, 'REGION'] = df_generation.loc[unmapped_mask, 'UNIT_NAME'].apply(infer_region_from_name)
+    df_generation.loc[unmapped_mask, 'REGION'] = infer_regions_from_names(df_generation.loc[unmapped_mask, 'UNIT_NAME'])
     
     df_generation['REGION'] = df_generation['REGION'].fillna('Other')
 
     df_generation['REGION'] = df_generation['REGION'].str.strip()
     df_generation['UNIT_NAME'] = df_generation['UNIT_NAME'].str.strip()
     
-    print(f"   -> Region distribution: {df_generation['REGION'].value_counts().to_dict()}")
+    # A handful of regions and fuel types: group on category codes rather
+    # than hashing the strings, and only over combinations actually present
+    df_generation['REGION'] = df_generation['REGION'].astype('category')
+    df_generation['FUEL_TYPE'] = df_generation['FUEL_TYPE'].astype('category')
     
-    regional_summary = df_generation.groupby(['REGION', 'FUEL_TYPE'])['NET_P'].sum().reset_index()
+    if DEBUG_REGIONAL:
+        print(f"   -> Region distribution: {df_generation['REGION'].value_counts().to_dict()}")
+        regional_summary = df_generation.groupby(['REGION', 'FUEL_TYPE'], observed=True)['NET_P'].sum()
+        print(f"   -> Regional fuel summary:\n{regional_summary.to_string(float_format='%.1f')}")
     
-    print(f"   -> Regional fuel summary:")
-    for _, row in regional_summary.iterrows():
-        print(f"      {row['REGION']:<8}- {row['FUEL_TYPE']:<16}: {row['NET_P']: >7.1f} MW")
+    # One row per region with every fuel type as a column (0 where absent)
+    wide = df_generation.pivot_table(
+        index='REGION', columns='FUEL_TYPE', values='NET_P', aggfunc='sum', fill_value=0.0, observed=True
+    ).reindex(columns=ALL_FUEL_TYPES, fill_value=0.0)
+    wide['Total_Generation'] = wide.sum(axis=1)
     
-    for region in df_generation['REGION'].unique():
-        csv_path = STRU_DATA_DIR / f"{region}.csv"
-        region_data = regional_summary[regional_summary['REGION'] == region]
-        
-        row_data = {'Timestamp': timestamp}
-        
-        for fuel_type in ALL_FUEL_TYPES:
-            row_data[fuel_type] = region_data[region_data['FUEL_TYPE'] == fuel_type]['NET_P'].sum()
-        
-        row_data['Total_Generation'] = sum(row_data[ft] for ft in ALL_FUEL_TYPES)
-        
-        row_data['AirTemperature'] = None
-        row_data['WindSpeed'] = None
-        row_data['SunshineDuration'] = None
-        
-        new_df = pd.DataFrame([row_data])
-
-        if csv_path.exists():
-            try:
-                existing_df = read_csv_with_lock(csv_path)
-                existing_df['Timestamp'] = pd.to_datetime(existing_df['Timestamp'])
-                
-                if timestamp in existing_df['Timestamp'].values:
-                    idx = existing_df[existing_df['Timestamp'] == timestamp].index[0]
-                    for col in ALL_FUEL_TYPES + ['Total_Generation']:
-                        existing_df.loc[idx, col] = new_df.loc[0, col]
-                    write_csv_with_lock(existing_df, csv_path)
-                    print(f"   ✅ Updated generation data for {region}")
-                else:
-                    write_csv_with_lock(new_df, csv_path, mode='a')
-                    print(f"   ✅ Appended generation data for {region}")
-            except Exception as e:
-                print(f"   ❌ ERROR updating {region}: {e}")
-                write_csv_with_lock(new_df, csv_path)
-                print(f"   ✅ Created new file for {region} after error.")
-        else:
-            write_csv_with_lock(new_df, csv_path)
-            print(f"   ✅ Created new file for {region}")
+    # Each region is its own file, so the writes can overlap
+    with ThreadPoolExecutor(max_workers=len(wide) or 1) as executor:
+        messages = executor.map(
+            lambda item: write_region_row(item[0], item[1], timestamp),
+            # Plain value lists per region; no Series or DataFrame per row
+            zip(wide.index, wide.to_numpy().tolist())
+        )
+        for message in messages:
+            print(message)
 
-def log_fluctuations(df_generation):
+def log_fluctuations(df_generation, run_time):
     """
     Logs plant fluctuations with details (region, power).
     If no changes, logs a compact status line.
     The state file now stores a dictionary of unit details for richer comparison.
     """
-    run_time = datetime.now(TAIWAN_TZ)
-    
     previous_units_data = {}
-    if STATE_FILE.exists():
+    previous_state = STATE_FILE.read_bytes() if STATE_FILE.exists() else b''
+    if previous_state:
         try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                previous_units_data = json.load(f)
-        except json.JSONDecodeError:
+            previous_units_data = orjson.loads(previous_state)
+        except orjson.JSONDecodeError:
             print(f"   -> WARNING: Could not read {STATE_FILE.name}. Assuming fresh start.")
             previous_units_data = {}
     
-    previous_names = set(previous_units_data.keys())
-
-    agg_df = df_generation.groupby(['UNIT_NAME', 'REGION'], as_index=False)['NET_P'].sum()
-    current_units_data = agg_df.set_index('UNIT_NAME')[['REGION', 'NET_P']].to_dict('index')
-    
-    current_names = set(current_units_data.keys())
+    # Nothing reads the aggregate in order, so skip the groupby sort; build
+    # the state dict from column lists rather than one Series per row
+    agg_df = df_generation.groupby(['UNIT_NAME', 'REGION'], as_index=False, sort=False, observed=True)['NET_P'].sum()
+    current_units_data = {
+        name: {'REGION': region, 'NET_P': net_p}
+        for name, region, net_p in zip(agg_df['UNIT_NAME'].tolist(), agg_df['REGION'].tolist(), agg_df['NET_P'].tolist())
+    }
     
-    added_names = current_names - previous_names
-    removed_names = previous_names - current_names
+    # Key views support set operations directly
+    added_names = current_units_data.keys() - previous_units_data.keys()
+    removed_names = previous_units_data.keys() - current_units_data.keys()
     
     with open(LOG_FILE, 'a', encoding='utf-8') as f:
         if not added_names and not removed_names:
@@ -315,8 +419,20 @@ def log_fluctuations(df_generation):
                     last_net_p = details.get('NET_P', 0.0)
                     f.write(f"➖ GONE:  {name:<20} | Region: {region:<8} | Last Power: {last_net_p: >6.1f} MW\n")
 
-    with open(STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(current_units_data, f, ensure_ascii=False, indent=2)
+    # The state keeps each unit's last power for the GONE lines, so it can
+    # only be skipped when it is byte-for-byte unchanged
+    current_state = orjson.dumps(
+        current_units_data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    )
+    if current_state != previous_state:
+        STATE_FILE.write_bytes(current_state)
+
+async def fetch_all(update_dt, cache_bust):
+    """Fetch generation and demand data at the same time."""
+    return await asyncio.gather(
+        asyncio.to_thread(fetch_generation_data, update_dt, cache_bust),
+        asyncio.to_thread(fetch_demand_data, update_dt, cache_bust)
+    )
 
 def main():
     """Main execution function."""
@@ -326,7 +442,11 @@ def main():
     
     ensure_directories()
     
-    df_generation, timestamp = fetch_generation_data()
+    # Both requests only need the 10-minute slot, so they run concurrently;
+    # the run time also supplies their cache-busting query parameter
+    (df_generation, timestamp), _ = asyncio.run(
+        fetch_all(round_to_10min(run_time), int(run_time.timestamp()))
+    )
     if df_generation is None:
         print("❌ Failed to fetch generation data. Exiting.")
         return
@@ -336,9 +456,7 @@ def main():
     
     update_regional_data(df_generation, timestamp)
     
-    fetch_demand_data(timestamp)
-    
-    log_fluctuations(df_generation)
+    log_fluctuations(df_generation, run_time)
     
     print(f"[{datetime.now(TAIWAN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] Pipeline completed successfully!")
     print(f"{'='*60}\n")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# SCRIPT: rollup_generators.py
+# PURPOSE:
+#   - Moves finished days out of generator_data/all_generators.csv
+#   - Stores each day as generator_data/all_generators_YYYYMMDD.parquet
+#   - Leaves only today's rows in the CSV so appends and column widening
+#     in generator_tracking.py stay cheap
+#   - Meant to run once a night, e.g. 5 0 * * * /path/to/python rollup_generators.py
+# ==============================================================================
+
+import io, os, fcntl
+from datetime import datetime
+import pandas as pd
+
+from generator_tracking import GENERATORS_FILE, DATA_DIR, TAIWAN_TZ, log_message, ensure_directories, is_current_file
+
+def parquet_path(day):
+    """Parquet file holding one day ('YYYY-MM-DD') of generator rows."""
+    return DATA_DIR / f"all_generators_{day.replace('-', '')}.parquet"
+
+def write_day(day, header, lines):
+    """Write one day of raw CSV lines to its Parquet file, merging with an earlier rollup."""
+    df = pd.read_csv(io.StringIO(header + ''.join(lines)), dtype={'Timestamp': str})
+    path = parquet_path(day)
+    if path.exists():
+        df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+        df = df.drop_duplicates(subset='Timestamp', keep='last')
+    df.to_parquet(path, compression='zstd', index=False)
+    return len(df)
+
+def rollup_generators():
+    """Roll every day before today from the CSV into Parquet and truncate the CSV."""
+    if not GENERATORS_FILE.exists():
+        log_message("No generator file to roll up")
+        return
+
+    today = datetime.now(TAIWAN_TZ).strftime('%Y-%m-%d')
+
+    while True:
+        with open(GENERATORS_FILE, 'r+', encoding='utf-8', newline='') as f:  # writable: lockf needs it for LOCK_EX
+            fcntl.lockf(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if not is_current_file(f, GENERATORS_FILE):
+                    continue  # Replaced while waiting for the lock; reopen
+                header = f.readline()
+
+                # Timestamps start with the date, so rows can be split by prefix
+                # without parsing them
+                old_days = {}
+                kept_lines = []
+                for line in f:
+                    day = line[:10]
+                    if day < today:
+                        old_days.setdefault(day, []).append(line)
+                    else:
+                        kept_lines.append(line)
+
+                if not old_days:
+                    log_message("Nothing to roll up")
+                    return
+
+                for day, lines in sorted(old_days.items()):
+                    rows = write_day(day, header, lines)
+                    log_message(f"Rolled {len(lines)} rows for {day} into {parquet_path(day).name} ({rows} rows total)")
+
+                tmp_path = GENERATORS_FILE.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+                    dst.write(header)
+                    dst.writelines(kept_lines)
+                os.replace(tmp_path, GENERATORS_FILE)
+                log_message(f"Kept {len(kept_lines)} rows from {today} in {GENERATORS_FILE.name}")
+                return
+            finally:
+                fcntl.lockf(f.fileno(), fcntl.LOCK_UN)
+
+def main():
+    """Main execution function."""
+    print(f"\n{'='*60}")
+    print(f"[{datetime.now(TAIWAN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] Starting generator rollup...")
+    ensure_directories()
+    rollup_generators()
+    print(f"[{datetime.now(TAIWAN_TZ).strftime('%Y-%m-%d %H:%M:%S')}] Generator rollup completed!")
+    print(f"{'='*60}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# SCRIPT: run_pipeline_loop.py
+# PURPOSE:
+#   - Long-running alternative to the generator_tracking.py and
+#     fetch_weather_integrated.py cron entries
+#   - Imports both scripts once and keeps their HTTP sessions alive
+#   - Fetches Taipower and CWA data concurrently every 10 minutes
+# ==============================================================================
+
+import asyncio
+from datetime import datetime, timedelta
+
+import generator_tracking
+import fetch_weather_integrated
+
+INTERVAL_MINUTES = 10
+
+def seconds_until_next_tick(now):
+    """Seconds until the next 10-minute boundary."""
+    next_tick = now.replace(minute=(now.minute // INTERVAL_MINUTES) * INTERVAL_MINUTES, second=0, microsecond=0)
+    next_tick += timedelta(minutes=INTERVAL_MINUTES)
+    return (next_tick - now).total_seconds()
+
+async def run_tick():
+    """Fetch both sources concurrently, then write generator and weather data."""
+    generator_tracking.ensure_directories()
+    fetch_weather_integrated.ensure_directories()
+
+    # The fetchers block on requests, so each runs in its own thread
+    (current_generators, timestamp), weather_data = await asyncio.gather(
+        asyncio.to_thread(generator_tracking.fetch_generation_data),
+        asyncio.to_thread(fetch_weather_integrated.fetch_weather_data)
+    )
+
+    if current_generators is not None:
+        generator_tracking.update_generator_data(current_generators, timestamp)
+    else:
+        generator_tracking.log_message("Failed to fetch generation data.")
+
+    if weather_data:
+        fetch_weather_integrated.process_and_update_data(weather_data)
+
+async def main_loop():
+    """Run one tick on every 10-minute boundary until interrupted."""
+    while True:
+        await asyncio.sleep(seconds_until_next_tick(datetime.now()))
+
+        print(f"\n{'='*60}")
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting pipeline tick...")
+        try:
+            await run_tick()
+        except Exception as e:
+            # Keep the loop alive; the next tick retries from scratch
+            print(f"❌ ERROR during pipeline tick: {e}")
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Pipeline tick completed!")
+        print(f"{'='*60}\n")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main_loop())
+    except KeyboardInterrupt:
+        print("Stopped.")
@@ -6,19 +6,32 @@
 #   - Prints a formatted report of the current generation mix
 #   - Checks data completeness (generation + weather)
 # ==============================================================================
-import pandas as pd
+# pandas and pyarrow are imported inside the functions that use them, so
+# the fluctuation report alone does not pay for loading them
 from pathlib import Path
-import sys
+import sys, os, io, csv, mmap
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import pytz
+from functools import lru_cache
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
 
 # --- Configuration ---
 BASE_DIR = Path(__file__).parent
 STRU_DATA_DIR = BASE_DIR / "stru_data"
 LOGS_DIR = BASE_DIR / "logs"
 LOG_FILE = LOGS_DIR / "fluctuation_log.txt"
+# Parquet copies of the parsed CSVs, reused while the CSV is unchanged
+PARQUET_CACHE_DIR = BASE_DIR / "cache"
 
-TAIWAN_TZ = pytz.timezone('Asia/Taipei')
+# Header line of each report in the fluctuation log
+REPORT_MARKER = b"--- Fluctuation Report @"
+# check_data_sync parses only this much of the end of each CSV
+CSV_TAIL_BYTES = 64 * 1024
+# Files are read in parallel; Arrow's parser releases the GIL
+MAX_READ_WORKERS = 8
+
+TAIWAN_TZ = ZoneInfo('Asia/Taipei')
 
 # Fuel types for aggregation
 FUEL_TYPES = ['Nuclear', 'Coal', 'Co-Gen', 'IPP-Coal', 'LNG', 'IPP-LNG', 
@@ -41,9 +54,133 @@ FUEL_TYPE_CHINESE = {
     'Storage': '儲能(Energy Storage System)'
 }
 
-def verify_aggregation():
+# How each weather reading is shown in the summary
+WEATHER_FORMATS = {
+    'AirTemperature': "Temp: {:.1f}°C",
+    'WindSpeed': "Wind: {:.1f} m/s",
+    'SunshineDuration': "Sunshine: {:.1f} hr"
+}
+
+# Only the columns the report uses are converted
+NEEDED_COLUMNS = ['Timestamp'] + FUEL_TYPES + ['Total_Generation', 'AirTemperature', 'WindSpeed', 'SunshineDuration']
+# check_data_sync only looks at these
+SYNC_COLUMNS = ['Timestamp', 'Total_Generation', 'AirTemperature']
+
+@lru_cache(maxsize=None)
+def csv_options():
+    """Build the Arrow CSV reader options on first use."""
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    
+    # Arrow parses the "+08:00" offsets itself; keep them in Taiwan time for display
+    timestamp_type = pa.timestamp('ms', tz='Asia/Taipei')
+    # Missing columns come back as nulls, so every file yields the same schema.
+    # float32 holds the MW and weather readings to well past the one decimal
+    # the report prints
+    report_schema = pa.schema([('Timestamp', timestamp_type)] + [(col, pa.float32()) for col in NEEDED_COLUMNS[1:]])
+    return SimpleNamespace(
+        read=pa_csv.ReadOptions(block_size=8 << 20),
+        report_schema=report_schema,
+        report=pa_csv.ConvertOptions(
+            include_columns=NEEDED_COLUMNS,
+            include_missing_columns=True,
+            column_types=report_schema
+        ),
+        sync=pa_csv.ConvertOptions(
+            include_columns=SYNC_COLUMNS,
+            column_types={'Timestamp': timestamp_type}
+        )
+    )
+
+def load_region_table(csv_file):
+    """Return the report columns of a CSV, from its Parquet copy if still current.
+    
+    The copy is stamped with the CSV's mtime, so any append to the CSV
+    invalidates it.
+    """
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pa_csv
+    
+    options = csv_options()
+    csv_mtime_ns = csv_file.stat().st_mtime_ns
+    cache_file = PARQUET_CACHE_DIR / f"{csv_file.stem}.parquet"
+    try:
+        if cache_file.stat().st_mtime_ns == csv_mtime_ns:
+            table = pq.read_table(cache_file)
+            if table.schema.equals(options.report_schema):  # Else written with older column types
+                return table
+    except FileNotFoundError:
+        pass
+    
+    table = pa_csv.read_csv(csv_file, read_options=options.read, convert_options=options.report)
+    PARQUET_CACHE_DIR.mkdir(exist_ok=True)
+    tmp_path = cache_file.with_suffix('.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.utime(tmp_path, ns=(csv_mtime_ns, csv_mtime_ns))
+    os.replace(tmp_path, cache_file)
+    return table
+
+def read_csv_tail(csv_file, rows, convert_options):
+    """Parse the header and the last `rows` lines of a CSV, skipping the rest.
+    
+    Falls back to parsing the whole file if the tail block holds too few lines.
+    """
+    from pyarrow import csv as pa_csv
+    
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        start = max(body_start, f.seek(0, os.SEEK_END) - CSV_TAIL_BYTES)
+        f.seek(start)
+        lines = f.read().rstrip(b'\n').split(b'\n')
+    
+    if start > body_start:
+        lines = lines[1:]  # Probably cut off mid-line
+        if len(lines) < rows:
+            table = pa_csv.read_csv(csv_file, read_options=csv_options().read, convert_options=convert_options)
+            return table.slice(max(table.num_rows - rows, 0))
+    
+    return pa_csv.read_csv(io.BytesIO(header + b'\n'.join(lines[-rows:]) + b'\n'), convert_options=convert_options)
+
+def has_timestamp_column(csv_file):
+    """Return True if the CSV's header line has a Timestamp column."""
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader([f.readline()]), [])
+    return 'Timestamp' in header
+
+def load_latest_rows(csv_file):
+    """Return a file's rows at its latest timestamp, tagged with its region.
+    
+    Returns None for files without timestamps (e.g. electricity_demand.csv).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    if not has_timestamp_column(csv_file):
+        return None  # Not a regional file; don't parse or cache it
+    table = load_region_table(csv_file)
+    file_latest = pc.max(table['Timestamp'])
+    if not file_latest.is_valid:
+        return None
+    latest_rows = table.filter(pc.equal(table['Timestamp'], file_latest))
+    # Add region name from filename
+    return latest_rows.append_column('Region', pa.repeat(csv_file.stem, latest_rows.num_rows).dictionary_encode())
+
+def list_csv_files():
+    """Return the CSV files in the data directory, sorted by name."""
+    # scandir gets the entry type with the name, no extra stat per file
+    try:
+        with os.scandir(STRU_DATA_DIR) as entries:
+            return sorted(Path(entry.path) for entry in entries if entry.name.endswith('.csv') and entry.is_file())
+    except FileNotFoundError:
+        return []
+
+def verify_aggregation(all_csv_files=None):
     """Finds, loads, and verifies the latest data entries from regional CSV files."""
-    run_time = pd.Timestamp.now(tz=TAIWAN_TZ)
+    import pandas as pd
+    import pyarrow as pa
+    
+    run_time = datetime.now(TAIWAN_TZ)
     print(f"[{run_time.strftime('%Y-%m-%d %H:%M:%S')}] --- Starting Verification Script ---")
 
     if not STRU_DATA_DIR.exists():
@@ -51,58 +188,67 @@ def verify_aggregation():
         sys.exit(1)
 
     # Load all regional CSV files
-    all_csv_files = list(STRU_DATA_DIR.glob('*.csv'))
+    if all_csv_files is None:
+        all_csv_files = list_csv_files()
     if not all_csv_files:
         print(f"🚨 ERROR: No CSV files found in '{STRU_DATA_DIR}'.")
         sys.exit(1)
         
     print(f"   -> Found {len(all_csv_files)} regional data files to analyze.")
     
-    # Read and combine all regional data
-    all_data = []
-    for csv_file in all_csv_files:
-        try:
-            df = pd.read_csv(csv_file)
-            df['Region'] = csv_file.stem  # Add region name from filename
-            all_data.append(df)
-        except Exception as e:
-            print(f"⚠️ WARNING: Failed to read {csv_file.name}: {e}")
+    # Read the files in parallel, keeping only the rows at the latest timestamp seen so far
+    files_read = 0
+    latest_timestamp = None
+    latest_tables = []
+    with ThreadPoolExecutor(max_workers=min(MAX_READ_WORKERS, len(all_csv_files))) as executor:
+        futures = [executor.submit(load_latest_rows, csv_file) for csv_file in all_csv_files]
+        for csv_file, future in zip(all_csv_files, futures):
+            try:
+                latest_rows = future.result()
+            except Exception as e:
+                print(f"⚠️ WARNING: Failed to read {csv_file.name}: {e}")
+                continue
+            files_read += 1
+            
+            if latest_rows is None:
+                continue
+            file_latest = latest_rows['Timestamp'][0].as_py()
+            if latest_timestamp and file_latest < latest_timestamp:
+                continue
+            if file_latest != latest_timestamp:
+                # Newer than every file so far; earlier slices are stale
+                latest_timestamp = file_latest
+                latest_tables = []
+            latest_tables.append(latest_rows)
     
-    if not all_data:
+    if not files_read:
         print("🚨 ERROR: Could not read any data files.")
         sys.exit(1)
     
-    # Combine all regional data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df['Timestamp'] = pd.to_datetime(combined_df['Timestamp'])
-    
-    # Find the latest timestamp
-    latest_timestamp = combined_df['Timestamp'].max()
-    latest_df = combined_df[combined_df['Timestamp'] == latest_timestamp].copy()
-    
-    if latest_df.empty:
+    if not latest_tables:
         print(f"🚨 ERROR: No data found for the latest timestamp ({latest_timestamp}).")
         sys.exit(1)
+    
+    # Only the latest rows of each region are combined
+    latest_df = pa.concat_tables(latest_tables).to_pandas()
+    # One plain dict per region for the display loops below
+    records = latest_df.to_dict(orient='records')
+    weather_cols = ['AirTemperature', 'WindSpeed', 'SunshineDuration']
 
     # Aggregate fuel types across all regions
-    fuel_sums = {}
-    for fuel_type in FUEL_TYPES:
-        if fuel_type in latest_df.columns:
-            fuel_sums[fuel_type] = latest_df[fuel_type].sum()
-        else:
-            fuel_sums[fuel_type] = 0.0
-    
-    total_generation = sum(fuel_sums.values())
+    fuel_sums = latest_df.reindex(columns=FUEL_TYPES, fill_value=0.0).sum(axis=0)
+    total_generation = float(fuel_sums.sum())
 
     # Check data completeness
     print("\n" + "="*50)
     print("📊 DATA COMPLETENESS CHECK")
     print("="*50)
     
-    for _, row in latest_df.iterrows():
+    # Both flags computed column-wise for all regions at once
+    generation_ok = (latest_df['Total_Generation'] > 0).tolist()
+    weather_ok = latest_df[weather_cols].notna().all(axis=1).tolist()
+    for row, has_generation, has_weather in zip(records, generation_ok, weather_ok):
         region = row['Region']
-        has_generation = row['Total_Generation'] > 0 if 'Total_Generation' in row else False
-        has_weather = all(pd.notna(row.get(col)) for col in ['AirTemperature', 'WindSpeed', 'SunshineDuration'])
         
         status = "✅" if has_generation and has_weather else "⚠️"
         gen_status = "✓" if has_generation else "✗"
@@ -117,45 +263,35 @@ def verify_aggregation():
     print("\n各能源別即時發電量小計(每10分鐘更新)：")
     print(f"總計： {total_generation:,.1f} MW\n")
 
-    # Define display order
-    display_order = ['Nuclear', 'Coal', 'Co-Gen', 'IPP-Coal', 'LNG', 'IPP-LNG', 
-                    'Oil', 'Diesel', 'Hydro', 'Wind', 'Solar', 'Other_Renewable', 'Storage']
-    
-    for fuel_type in display_order:
-        if fuel_type in fuel_sums:
-            total_mw = fuel_sums[fuel_type]
-            percentage = (total_mw / total_generation) * 100 if total_generation > 0 else 0
-            chinese_name = FUEL_TYPE_CHINESE.get(fuel_type, fuel_type)
-            
-            print(f"{chinese_name}")
-            print(f"{total_mw:,.1f}")
-            print(f"{percentage:.3f}%\n")
+    # Build the whole breakdown (in FUEL_TYPES order) and write it at once
+    percentages = fuel_sums / total_generation * 100 if total_generation > 0 else fuel_sums * 0
+    report = [
+        f"{FUEL_TYPE_CHINESE[fuel_type]}\n{total_mw:,.1f}\n{percentage:.3f}%\n\n"
+        for fuel_type, total_mw, percentage in zip(FUEL_TYPES, fuel_sums.tolist(), percentages.tolist())
+    ]
+    sys.stdout.write(''.join(report))
     
     # Display weather summary
     print("="*50)
     print("🌤️ WEATHER SUMMARY (Regional Averages)")
     print("="*50)
     
-    weather_cols = ['AirTemperature', 'WindSpeed', 'SunshineDuration']
-    for _, row in latest_df.iterrows():
-        region = row['Region']
-        if region == 'Other':
-            continue  # Skip Other region for weather
-        
-        weather_data = []
-        for col in weather_cols:
-            if col in row and pd.notna(row[col]):
-                if col == 'AirTemperature':
-                    weather_data.append(f"Temp: {row[col]:.1f}°C")
-                elif col == 'WindSpeed':
-                    weather_data.append(f"Wind: {row[col]:.1f} m/s")
-                elif col == 'SunshineDuration':
-                    weather_data.append(f"Sunshine: {row[col]:.1f} hr")
-        
-        if weather_data:
-            print(f"{region}: {' | '.join(weather_data)}")
-        else:
-            print(f"{region}: No weather data available")
+    # Weather feed not started yet or down: one line instead of one per region
+    if not latest_df[weather_cols].notna().to_numpy().any():
+        print("No weather data available for any region")
+    else:
+        report = []
+        for row in records:
+            region = row['Region']
+            if region == 'Other':
+                continue  # Skip Other region for weather
+            
+            weather_data = [WEATHER_FORMATS[col].format(row[col]) for col in weather_cols if pd.notna(row[col])]
+            if weather_data:
+                report.append(f"{region}: {' | '.join(weather_data)}\n")
+            else:
+                report.append(f"{region}: No weather data available\n")
+        sys.stdout.write(''.join(report))
     
     print("="*50 + "\n")
     print("✅ Verification report complete.")
@@ -167,18 +303,16 @@ def display_latest_fluctuation_report():
         print("No fluctuation log found.")
         return
 
-    with open(LOG_FILE, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    latest_report_lines = []
-    found_latest = False
-    for i in reversed(range(len(lines))):
-        if "--- Fluctuation Report @" in lines[i]:
-            found_latest = True
-            latest_report_lines.insert(0, lines[i])
-            break
-        if found_latest or lines[i].strip():
-            latest_report_lines.insert(0, lines[i])
+    # Search the mapped log from the end; only the last report is copied out
+    report = ''
+    with open(LOG_FILE, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:  # mmap rejects empty files
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+                marker_at = log.rfind(REPORT_MARKER)
+                # Without a header the whole log is shown, as before
+                report_start = log.rfind(b'\n', 0, marker_at) + 1 if marker_at != -1 else 0
+                report = log[report_start:].decode('utf-8')
+    latest_report_lines = [line for line in report.split('\n') if line.strip()]
 
     print("\n" + "="*50)
     print("--- Latest Fluctuation Report ---")
@@ -189,25 +323,29 @@ def display_latest_fluctuation_report():
         print("No fluctuation reports found.")
     print("="*50)
 
-def check_data_sync():
+def check_data_sync(csv_files=None):
     """Check timestamp synchronization between generation and weather data."""
+    import pandas as pd
+    
     print("\n" + "="*50)
     print("🔄 TIMESTAMP SYNCHRONIZATION CHECK")
     print("="*50)
     
-    for csv_file in STRU_DATA_DIR.glob('*.csv'):
+    if csv_files is None:
+        csv_files = list_csv_files()
+    with ThreadPoolExecutor(max_workers=MAX_READ_WORKERS) as executor:
+        # Get last 5 entries of every file; printed in order below
+        futures = [executor.submit(read_csv_tail, csv_file, 5, csv_options().sync) for csv_file in csv_files]
+    
+    for csv_file, future in zip(csv_files, futures):
         try:
-            df = pd.read_csv(csv_file)
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-            
-            # Get last 5 entries
-            recent_df = df.tail(5)
+            recent_df = future.result().to_pandas()
             
             print(f"\n{csv_file.stem} (last 5 entries):")
-            for _, row in recent_df.iterrows():
-                timestamp = row['Timestamp'].strftime('%Y-%m-%d %H:%M')
-                has_gen = row.get('Total_Generation', 0) > 0
-                has_weather = pd.notna(row.get('AirTemperature'))
+            for row in recent_df.itertuples(index=False):
+                timestamp = row.Timestamp.strftime('%Y-%m-%d %H:%M')
+                has_gen = row.Total_Generation > 0
+                has_weather = pd.notna(row.AirTemperature)
                 
                 gen_marker = "G" if has_gen else "-"
                 weather_marker = "W" if has_weather else "-"
@@ -221,6 +359,8 @@ def check_data_sync():
     print("="*50)
 
 if __name__ == "__main__":
-    verify_aggregation()
+    # List the data directory once for both checks
+    csv_files = list_csv_files()
+    verify_aggregation(csv_files)
     display_latest_fluctuation_report()
-    check_data_sync()
\ No newline at end of file
+    check_data_sync(csv_files)
\ No newline at end of file